@@ -0,0 +1,70 @@
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create-swap throughput with match alerts against a populated table")
+    parser.add_argument("--existing", type=int, default=20000, help="open swaps already in the table")
+    parser.add_argument("--creates", type=int, default=500, help="swaps posted through /swaps/create")
+    parser.add_argument("--modules", type=int, default=400)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=5)
+    parser.add_argument("--database-url", help="defaults to a throwaway SQLite file")
+    args = parser.parse_args()
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{tempfile.mkdtemp()}/alerts.db"
+    os.environ.update(SEED_ON_MIGRATE="false", MAIL_TRANSPORT="memory")
+    from sqlalchemy import func, insert, select
+    from modswap.app import create_app
+    from modswap.app.extensions import db
+    from modswap.app.models import Module, Notification, SwapRequest, User, swap_give_modules, swap_want_modules
+
+    rng = random.Random(args.seed)
+    app = create_app()
+    with app.app_context():
+        db.session.execute(insert(Module), [
+            {"code": f"B{i:04d}", "name": f"Module {i}", "university": "Bench"} for i in range(args.modules)
+        ])
+        db.session.execute(insert(User), [
+            {"email": f"alert{i}@example.ac.uk", "email_notifications": i % 2 == 0} for i in range(args.users)
+        ])
+        module_ids = list(db.session.execute(select(Module.id)).scalars())
+        user_ids = list(db.session.execute(select(User.id)).scalars())
+        db.session.execute(insert(SwapRequest), [
+            {"user_id": rng.choice(user_ids), "status": "Open", "alerts_email": rng.random() < 0.3}
+            for _ in range(args.existing)
+        ])
+        swap_ids = list(db.session.execute(select(SwapRequest.id)).scalars())
+        gives, wants = [], []
+        for sid in swap_ids:
+            picks = rng.sample(module_ids, 4)
+            gives += [{"swap_id": sid, "module_id": m} for m in picks[:2]]
+            wants += [{"swap_id": sid, "module_id": m} for m in picks[2:]]
+        db.session.execute(insert(swap_give_modules), gives)
+        db.session.execute(insert(swap_want_modules), wants)
+        db.session.commit()
+
+    clients = {}
+    started = time.perf_counter()
+    for n in range(args.creates):
+        uid = rng.choice(user_ids)
+        if uid not in clients:
+            clients[uid] = app.test_client()
+            with clients[uid].session_transaction() as session:
+                session["_user_id"] = str(uid)
+        picks = rng.sample(module_ids, 4)
+        clients[uid].post("/swaps/create", data={"give": picks[:2], "want": picks[2:]})
+    elapsed = time.perf_counter() - started
+    with app.app_context():
+        alerts = db.session.execute(select(func.count()).select_from(Notification).where(Notification.type == "match")).scalar()
+    print(f"{args.creates} creates against {args.existing} open swaps in {elapsed:.2f}s "
+          f"({args.creates / elapsed * 60:.0f} creates/min), {alerts} match notifications")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from bench_import import catalogue as catalogue_rows
+
+
+def timed(client, path, runs, headers=None, before=None):
+    samples = []
+    size = 0
+    for _ in range(runs):
+        if before:
+            before()
+        started = time.perf_counter()
+        response = client.get(path, headers=headers or {})
+        samples.append((time.perf_counter() - started) * 1000)
+        size = len(response.data)
+    return statistics.median(samples), size, response
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create page and catalogue JSON with and without the catalogue cache")
+    parser.add_argument("--modules", type=int, default=5000)
+    parser.add_argument("--runs", type=int, default=30)
+    parser.add_argument("--database-url", help="defaults to a throwaway SQLite file")
+    args = parser.parse_args()
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{tempfile.mkdtemp()}/catalogue.db"
+    from modswap.app import create_app, importer
+
+    app = create_app()
+    with app.app_context():
+        importer.import_modules(catalogue_rows(args.modules, "Bench"), "csv")
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["_user_id"] = "1"
+
+    print(f"{'request':<34} {'p50 ms':>8} {'bytes':>10}")
+    cache = app.extensions["catalogue"]
+    for path in ("/swaps/create", "/swaps/modules"):
+        p50, size, _ = timed(client, path, args.runs, before=cache.lru.clear)
+        print(f"{path + ' (uncached)':<34} {p50:>8.1f} {size:>10}")
+    for path in ("/swaps/create", "/swaps/modules"):
+        p50, size, response = timed(client, path, args.runs)
+        print(f"{path + ' (cached)':<34} {p50:>8.1f} {size:>10}")
+        p50, size, _ = timed(client, path, args.runs, {"If-None-Match": response.headers["ETag"]})
+        print(f"{path + ' (revalidated, 304)':<34} {p50:>8.1f} {size:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from modswap.app.matching import IndexedSwap
+from modswap.app.chains import find_chains
+
+
+def synth_entries(n_swaps, n_modules, n_users, seed):
+    rng = random.Random(seed)
+    # Popular modules are asked for far more often than the long tail.
+    weights = [1.0 / (i + 1) ** 0.8 for i in range(n_modules)]
+    entries = {}
+    for sid in range(1, n_swaps + 1):
+        picks = rng.choices(range(n_modules), weights=weights, k=rng.randint(2, 6))
+        picks = list(dict.fromkeys(picks))
+        if len(picks) < 2:
+            picks.append((picks[0] + 1) % n_modules)
+        cut = rng.randint(1, len(picks) - 1)
+        entries[sid] = IndexedSwap(rng.randrange(n_users), picks[:cut], picks[cut:])
+    return entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the multi-party chain finder on synthetic swaps")
+    parser.add_argument("--swaps", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--modules", type=int, default=1500)
+    parser.add_argument("--max-len", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    print(f"{'swaps':>8} {'chains':>8} {'matched':>8} {'by length':<28} {'seconds':>8}")
+    for n in args.swaps:
+        entries = synth_entries(n, args.modules, max(2, n // 2), args.seed)
+        start = time.perf_counter()
+        chains = find_chains(entries, max_len=args.max_len)
+        elapsed = time.perf_counter() - start
+        lengths = {}
+        for c in chains:
+            lengths[c["length"]] = lengths.get(c["length"], 0) + 1
+        matched = sum(c["length"] for c in chains)
+        spread = " ".join(f"{k}:{v}" for k, v in sorted(lengths.items()))
+        print(f"{n:>8} {len(chains):>8} {matched:>8} {spread:<28} {elapsed:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Request latency and drain rate of the notification digest pipeline")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--per-user", type=int, default=4, help="reminders posted by each user")
+    parser.add_argument("--mail-delay", type=float, default=0.2, help="simulated seconds per send")
+    parser.add_argument("--failures", type=int, default=10, help="sends that fail before the server recovers")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--database-url", help="defaults to a throwaway SQLite file")
+    args = parser.parse_args()
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{tempfile.mkdtemp()}/dispatch.db"
+    os.environ.update(MAIL_TRANSPORT="memory", MAIL_DIGEST_DELAY="0", MAIL_RETRY_BASE="0", SEED_ON_MIGRATE="false")
+    from modswap.app import create_app
+    from modswap.app.dispatch import Dispatcher, MemoryTransport
+    from modswap.app.extensions import db
+    from modswap.app.models import User
+
+    app = create_app()
+    transport = app.extensions["mail_transport"] = MemoryTransport(args.mail_delay, args.failures)
+    with app.app_context():
+        users = [User(email=f"digest{i}@example.ac.uk", email_notifications=True) for i in range(args.users)]
+        db.session.add_all(users)
+        db.session.commit()
+        user_ids = [u.id for u in users]
+
+    latencies = []
+    for uid in user_ids:
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session["_user_id"] = str(uid)
+        for n in range(args.per_user):
+            started = time.perf_counter()
+            client.post("/profile/reminders/add", data={"deadline_note": f"reminder {n}"})
+            latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+    print(f"POST /profile/reminders/add: p50 {statistics.median(latencies):.1f} ms, "
+          f"p99 {latencies[int(len(latencies) * 0.99) - 1]:.1f} ms with a {args.mail_delay * 1000:.0f} ms mail server")
+
+    dispatcher = Dispatcher(app, args.workers)
+    started = time.perf_counter()
+    while dispatcher.run_once():
+        pass
+    elapsed = time.perf_counter() - started
+    print(f"{dispatcher.sent} digests in {elapsed:.2f}s with {args.workers} workers "
+          f"({dispatcher.retried} retried, {dispatcher.failed} failed, {transport.attempts} send attempts)")
+    if len(transport.outbox) != args.users:
+        sys.exit(f"expected one digest per user, got {len(transport.outbox)}")
+
+
+if __name__ == "__main__":
+    main()
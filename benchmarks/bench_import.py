@@ -0,0 +1,37 @@
+import argparse
+import os
+import sys
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+
+def catalogue(n, university):
+    yield "code,name,department,university,year\n"
+    for i in range(n):
+        yield f"{university}-M{i:06d},Module {i},Department {i % 40},{university},{i % 4 + 1}\n"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput and peak memory of the streaming module importer")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--database-url", help="defaults to a throwaway SQLite file")
+    args = parser.parse_args()
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{tempfile.mkdtemp()}/import.db"
+    from modswap.app import create_app
+    from modswap.app import importer
+    app = create_app()
+    print(f"{'rows':>8} {'rows/s':>10} {'seconds':>8} {'peak MiB':>9}")
+    with app.app_context():
+        for run, n in enumerate(args.rows):
+            tracemalloc.start()
+            result = importer.import_modules(catalogue(n, f"U{run}"), "csv", batch_size=args.batch_size)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f"{n:>8} {result['rows_per_sec']:>10.0f} {result['seconds']:>8.2f} {peak / 2 ** 20:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+
+def make_app(enabled):
+    from modswap.app import create_app
+    from modswap.config import Config
+    Config.METRICS_ENABLED = enabled
+    app = create_app()
+    client = app.test_client()
+    client.post("/auth/login", data={"email": "rajveer.saini@mail.bcu.ac.uk", "password": "Raj@123", "role": "student"})
+    return client
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-request cost of the metrics layer")
+    parser.add_argument("--paths", nargs="+", default=["/swaps/", "/profile/", "/chat/"])
+    parser.add_argument("--requests", type=int, default=2000, help="requests per mode, interleaved in rounds")
+    parser.add_argument("--database-url", help="defaults to a throwaway SQLite file")
+    args = parser.parse_args()
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{tempfile.mkdtemp()}/metrics.db"
+    clients = {"off": make_app(False), "on": make_app(True)}
+    samples = {"off": [], "on": []}
+    rounds = max(1, args.requests // (len(args.paths) * 10))
+    for _ in range(rounds):
+        for mode, client in clients.items():
+            for path in args.paths:
+                started = time.perf_counter()
+                for _ in range(10):
+                    client.get(path)
+                samples[mode].append((time.perf_counter() - started) / 10)
+    off, on = statistics.median(samples["off"]), statistics.median(samples["on"])
+    print(f"metrics off: {off * 1e6:8.0f} us/request")
+    print(f"metrics on:  {on * 1e6:8.0f} us/request")
+    print(f"overhead:    {(on - off) * 1e6:8.0f} us/request ({(on - off) / off * 100:+.1f}%)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+import argparse
+import os
+import random
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from modswap.app.matching import module_counts, overlap_scores
+
+
+def synth_swaps(n_swaps, n_modules, seed):
+    rng = random.Random(seed)
+    modules = [SimpleNamespace(id=i) for i in range(n_modules)]
+    swaps = []
+    for sid in range(1, n_swaps + 1):
+        picks = rng.sample(modules, rng.randint(2, 6))
+        cut = rng.randint(1, len(picks) - 1)
+        swaps.append(SimpleNamespace(id=sid, giving=picks[:cut], wanting=picks[cut:]))
+    return swaps
+
+
+def naive_score_for(s, others):
+    # The scoring loop admin.swaps used before the overlap counters.
+    s_g = {m.id for m in s.giving}
+    s_w = {m.id for m in s.wanting}
+    score = 0
+    for o in others:
+        if o.id == s.id:
+            continue
+        o_g = {m.id for m in o.giving}
+        o_w = {m.id for m in o.wanting}
+        score += len(o_w & s_g) + len(o_g & s_w)
+    return score
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare pairwise and counter-based admin scoring")
+    parser.add_argument("--swaps", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--modules", type=int, default=800)
+    parser.add_argument("--sample", type=int, default=200,
+                        help="swaps scored with the pairwise loop when the full run is too slow; the rest is extrapolated")
+    parser.add_argument("--naive-max", type=int, default=2000,
+                        help="largest size for which the pairwise loop scores every swap")
+    parser.add_argument("--seed", type=int, default=11)
+    args = parser.parse_args()
+    print(f"{'swaps':>8} {'pairwise s':>12} {'counters s':>12} {'speedup':>9}  check")
+    for n in args.swaps:
+        swaps = synth_swaps(n, args.modules, args.seed)
+        start = time.perf_counter()
+        sets = {s.id: ({m.id for m in s.giving}, {m.id for m in s.wanting}) for s in swaps}
+        fast = overlap_scores(sets, *module_counts(sets))
+        fast_t = time.perf_counter() - start
+        sample = swaps if n <= args.naive_max else random.Random(args.seed).sample(swaps, args.sample)
+        start = time.perf_counter()
+        slow = {s.id: naive_score_for(s, swaps) for s in sample}
+        slow_t = (time.perf_counter() - start) * n / len(sample)
+        same = all(fast[sid] == score for sid, score in slow.items())
+        label = "" if len(sample) == n else "~"
+        print(f"{n:>8} {label + format(slow_t, '.2f'):>12} {fast_t:>12.3f} {slow_t / fast_t:>8.0f}x  "
+              f"{'identical' if same else 'MISMATCH'} ({len(sample)} checked)")
+
+
+if __name__ == "__main__":
+    main()
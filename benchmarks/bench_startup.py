@@ -0,0 +1,46 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# Run in a fresh interpreter each time so every sample is a cold worker boot.
+CHILD = """
+import sys, time
+sys.path.insert(0, sys.argv[1])
+from modswap.app import create_app
+start = time.perf_counter()
+create_app()
+print(time.perf_counter() - start)
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure create_app() wall time in fresh processes")
+    parser.add_argument("--root", default=ROOT, help="source tree to import modswap from")
+    parser.add_argument("--database-url", help="defaults to a throwaway SQLite file")
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+    env = dict(os.environ)
+    if args.database_url:
+        env["DATABASE_URL"] = args.database_url
+    else:
+        env["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/startup.db"
+    samples = []
+    for i in range(args.runs + 1):
+        out = subprocess.run([sys.executable, "-c", CHILD, args.root], env=env, capture_output=True, text=True, check=True)
+        elapsed = float(out.stdout.strip().splitlines()[-1])
+        if i == 0:
+            print(f"first boot (empty database): {elapsed * 1000:.1f} ms")
+        else:
+            samples.append(elapsed)
+    samples.sort()
+    print(f"warm boots over {args.runs} runs: median {statistics.median(samples) * 1000:.1f} ms, "
+          f"min {samples[0] * 1000:.1f} ms, max {samples[-1] * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+import argparse
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("SEED_ON_MIGRATE", "false")
+os.environ.setdefault("AUTO_MIGRATE", "true")
+os.environ.setdefault("MAIL_TRANSPORT", "memory")
+
+from sqlalchemy import create_engine, select
+import datagen
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def report(name, latencies, queries):
+    print(f"  {name:<20} {len(latencies):>6} {percentile(latencies, 50):>8.1f} {percentile(latencies, 95):>8.1f} "
+          f"{percentile(latencies, 99):>8.1f} {sum(queries) / max(len(queries), 1):>8.1f}")
+
+
+def session_cookie(app, user_id, role):
+    serializer = app.session_interface.get_signing_serializer(app)
+    return serializer.dumps({"_user_id": str(user_id), "_fresh": True, "role": role})
+
+
+class Workload:
+    """Random requests for each benchmarked workflow over the generated data."""
+
+    def __init__(self, app, seed):
+        from modswap.app.extensions import db
+        from modswap.app.models import Module, SwapRequest, User
+        self.rng = random.Random(seed)
+        with app.app_context():
+            self.students = list(db.session.execute(
+                select(User.id, User.university).where(User.role == "student")
+            ).all())
+            self.admin_id = db.session.execute(select(User.id).where(User.role == "teacher")).scalar()
+            self.modules = {}
+            for mid, uni in db.session.execute(select(Module.id, Module.university)):
+                self.modules.setdefault(uni, []).append(mid)
+            self.swap_ids = list(db.session.execute(select(SwapRequest.id)).scalars())
+        self._lock = threading.Lock()
+
+    def student(self):
+        return self.rng.choice(self.students)
+
+    def picks(self, uni):
+        chosen = self.rng.sample(self.modules[uni], 4)
+        return chosen[:2], chosen[2:]
+
+    def request(self, workflow):
+        # (method, path, form, user_id, role)
+        with self._lock:
+            if workflow == "browse":
+                uid, _ = self.student()
+                return "GET", "/swaps/", None, uid, "student"
+            if workflow == "suggest":
+                uid, uni = self.student()
+                give, want = self.picks(uni)
+                return "POST", "/swaps/suggest", {"give": give, "want": want}, uid, "student"
+            if workflow == "create_post":
+                uid, uni = self.student()
+                give, want = self.picks(uni)
+                return "POST", "/swaps/create", {"give": give, "want": want}, uid, "student"
+            if workflow == "admin.swaps":
+                query = self.rng.choice(["", "?status=Open", "?priority=High", "?department=computing", "?q=module"])
+                return "GET", "/admin/swaps" + query, None, self.admin_id, "teacher"
+            if workflow == "admin.bulk":
+                ids = [self.swap_ids.pop() for _ in range(min(20, len(self.swap_ids)))]
+                action = self.rng.choice(["approve", "reject", "needs_info"])
+                return "POST", "/admin/swaps/bulk", {"action": action, "ids": ids}, self.admin_id, "teacher"
+        raise ValueError(workflow)
+
+
+WORKFLOWS = ("browse", "suggest", "create_post", "admin.swaps", "admin.bulk")
+
+
+def run_test_client(app, workload, requests):
+    from modswap.app.instrumentation import query_count
+    counts = []
+    app.after_request_funcs.setdefault(None, []).append(lambda r: counts.append(query_count()) or r)
+    clients = {}
+    print(f"  {'test client':<20} {'n':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'queries':>8}")
+    for workflow in WORKFLOWS:
+        latencies, queries = [], []
+        for _ in range(requests):
+            method, path, form, uid, role = workload.request(workflow)
+            client = clients.get((uid, role))
+            if client is None:
+                client = clients[(uid, role)] = app.test_client()
+                with client.session_transaction() as session:
+                    session.update({"_user_id": str(uid), "_fresh": True, "role": role})
+            counts.clear()
+            started = time.perf_counter()
+            client.open(path, method=method, data=form)
+            latencies.append((time.perf_counter() - started) * 1000)
+            queries.append(counts[0] if counts else 0)
+        report(workflow, latencies, queries)
+    app.after_request_funcs[None].pop()
+
+
+def run_http(app, workload, concurrency, duration, mix):
+    from werkzeug.serving import make_server
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+    cookie_name = app.config["SESSION_COOKIE_NAME"]
+    results = {w: [] for w in mix}
+    errors = []
+    deadline = time.monotonic() + duration
+    rng = random.Random(0)
+    weights = list(mix.values())
+
+    class NoRedirect(urllib.request.HTTPRedirectHandler):
+        def redirect_request(self, *args, **kwargs):
+            return None
+
+    opener = urllib.request.build_opener(NoRedirect)
+
+    def worker():
+        while time.monotonic() < deadline:
+            workflow = rng.choices(list(mix), weights=weights)[0]
+            method, path, form, uid, role = workload.request(workflow)
+            data = urllib.parse.urlencode(form, doseq=True).encode() if form else None
+            req = urllib.request.Request(base + path, data=data, method=method, headers={
+                "Cookie": f"{cookie_name}={session_cookie(app, uid, role)}",
+            })
+            started = time.perf_counter()
+            try:
+                opener.open(req, timeout=30).read()
+            except urllib.error.HTTPError as exc:
+                if exc.code >= 400:
+                    errors.append(exc.code)
+            except Exception as exc:
+                errors.append(type(exc).__name__)
+            results[workflow].append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(worker)
+    elapsed = time.perf_counter() - started
+    server.shutdown()
+    total = sum(len(v) for v in results.values())
+    print(f"  {'http x' + str(concurrency):<20} {'n':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for workflow, latencies in results.items():
+        if latencies:
+            print(f"  {workflow:<20} {len(latencies):>6} {percentile(latencies, 50):>8.1f} "
+                  f"{percentile(latencies, 95):>8.1f} {percentile(latencies, 99):>8.1f}")
+    print(f"  {total / elapsed:.0f} req/s over {elapsed:.1f}s, {len(errors)} errors")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency and queries per request of the core swap workflows")
+    parser.add_argument("--swaps", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--universities", type=int, default=5)
+    parser.add_argument("--modules", type=int, default=200, help="modules per university")
+    parser.add_argument("--requests", type=int, default=200, help="test-client requests per workflow")
+    parser.add_argument("--concurrency", type=int, default=16, help="HTTP load threads, 0 to skip")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of HTTP load per scale")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--database-url", help="e.g. postgresql+psycopg://localhost/modswap_bench; "
+                                               "defaults to a new SQLite file per scale")
+    parser.add_argument("--reset", action="store_true",
+                        help="drop schema public even if the Postgres database name lacks 'bench'")
+    args = parser.parse_args()
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    logging.getLogger("modswap.app.instrumentation").setLevel(logging.ERROR)
+    from modswap.app import create_app
+    from modswap.config import Config
+
+    for n in args.swaps:
+        url = args.database_url or f"sqlite:///{tempfile.mkdtemp()}/workflows.db"
+        engine = create_engine(url)
+        datagen.reset(engine, force=args.reset)
+        engine.dispose()
+        Config.SQLALCHEMY_DATABASE_URI = url
+        app = create_app()
+        with app.app_context():
+            started = time.perf_counter()
+            datagen.generate(n, args.universities, args.modules, seed=args.seed)
+            generated = time.perf_counter() - started
+        print(f"{n} swaps on {engine.dialect.name} (generated in {generated:.1f}s)")
+        workload = Workload(app, args.seed)
+        run_test_client(app, workload, args.requests)
+        if args.concurrency:
+            run_http(app, workload, args.concurrency, args.duration,
+                     {"browse": 4, "suggest": 4, "admin.swaps": 1, "create_post": 1})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+import random
+from datetime import datetime, timedelta
+from sqlalchemy import insert, select, text
+from modswap.app.extensions import db
+from modswap.app.models import Module, SwapRequest, User, swap_give_modules, swap_want_modules
+
+DEPARTMENTS = ("Computing", "Mathematics", "Physics", "Business", "Law", "Psychology", "Engineering", "History")
+PRIORITIES = (None, "High", "Medium", "Low")
+STATUSES = ("Open",) * 8 + ("Needs Info", None)
+
+
+def reset(engine, force=False):
+    # Postgres keeps one database between scales; SQLite runs get a new file.
+    if engine.dialect.name == "postgresql":
+        # Dropping the schema wipes everything, so only a database that is
+        # plainly a benchmark one is reset without being asked to.
+        if not force and "bench" not in (engine.url.database or ""):
+            raise RuntimeError(f"refusing to drop schema public of {engine.url.database!r}; "
+                               "use a database named *bench* or pass --reset")
+        with engine.begin() as conn:
+            conn.execute(text("DROP SCHEMA public CASCADE"))
+            conn.execute(text("CREATE SCHEMA public"))
+
+
+def generate(swaps, universities=5, modules_per_university=200, users=None, seed=1, batch=5000):
+    """Bulk-insert a synthetic catalogue, student body and swap table.
+
+    Module popularity follows a power law so a handful of modules dominate
+    the posting lists, as they do in a real registration week.
+    """
+    rng = random.Random(seed)
+    users = users or max(50, swaps // 5)
+    now = datetime.utcnow()
+    unis = [f"Uni{u:02d}" for u in range(universities)]
+    db.session.execute(insert(Module), [
+        {
+            "code": f"{uni[-2:]}{DEPARTMENTS[i % len(DEPARTMENTS)][:2].upper()}{i:04d}",
+            "name": f"{DEPARTMENTS[i % len(DEPARTMENTS)]} module {i}",
+            "department": DEPARTMENTS[i % len(DEPARTMENTS)],
+            "university": uni,
+            "year": i % 4 + 1,
+        }
+        for uni in unis for i in range(modules_per_university)
+    ])
+    db.session.execute(insert(User), [
+        {"email": f"student{i}@{unis[i % universities].lower()}.ac.uk", "university": unis[i % universities],
+         "role": "student", "email_notifications": i % 3 == 0}
+        for i in range(users)
+    ])
+    db.session.execute(insert(User), [{"email": "bench-admin@example.ac.uk", "role": "teacher"}])
+    db.session.commit()
+    modules_by_uni = {}
+    for mid, uni in db.session.execute(select(Module.id, Module.university)):
+        modules_by_uni.setdefault(uni, []).append(mid)
+    user_rows = db.session.execute(select(User.id, User.university).where(User.role == "student")).all()
+    weights = [1.0 / (i + 1) ** 0.8 for i in range(modules_per_university)]
+    for start in range(0, swaps, batch):
+        rows = []
+        for n in range(start, min(start + batch, swaps)):
+            user_id, uni = user_rows[rng.randrange(len(user_rows))]
+            rows.append({
+                "user_id": user_id,
+                "status": rng.choice(STATUSES),
+                "priority": rng.choice(PRIORITIES),
+                "created_at": now - timedelta(minutes=swaps - n),
+                "expires_at": now + timedelta(days=rng.randint(-10, 60)) if rng.random() < 0.5 else None,
+                "notes": f"bench swap {n}",
+                "visibility": "public",
+            })
+        first_id = (db.session.execute(select(db.func.max(SwapRequest.id))).scalar() or 0) + 1
+        db.session.execute(insert(SwapRequest), rows)
+        ids = db.session.execute(
+            select(SwapRequest.id, SwapRequest.user_id).where(SwapRequest.id >= first_id).order_by(SwapRequest.id)
+        ).all()
+        gives, wants = [], []
+        unis_by_user = dict(user_rows)
+        for sid, user_id in ids:
+            pool = modules_by_uni[unis_by_user[user_id]]
+            picks = list(dict.fromkeys(rng.choices(pool, weights=weights, k=rng.randint(2, 6))))
+            if len(picks) < 2:
+                picks.append(pool[(pool.index(picks[0]) + 1) % len(pool)])
+            cut = rng.randint(1, len(picks) - 1)
+            gives += [{"swap_id": sid, "module_id": m} for m in picks[:cut]]
+            wants += [{"swap_id": sid, "module_id": m} for m in picks[cut:]]
+        db.session.execute(insert(swap_give_modules), gives)
+        db.session.execute(insert(swap_want_modules), wants)
+        db.session.commit()
+    return {"modules": universities * modules_per_university, "users": users, "swaps": swaps}
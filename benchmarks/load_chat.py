@@ -0,0 +1,73 @@
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+
+def login(app, user_id):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["_user_id"] = str(user_id)
+        session["_fresh"] = True
+    return client
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulated concurrent chat clients against the in-process socket server")
+    parser.add_argument("--pairs", type=int, default=20, help="owner/partner conversations")
+    parser.add_argument("--messages", type=int, default=200, help="messages sent by each client")
+    parser.add_argument("--database-url", help="defaults to a throwaway SQLite file")
+    args = parser.parse_args()
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{tempfile.mkdtemp()}/chat.db"
+    from modswap.app import create_app
+    from modswap.app.extensions import db, socketio
+    from modswap.app.messaging import get_writer
+    from modswap.app.models import Message, SwapRequest, User
+
+    app = create_app()
+    with app.app_context():
+        users = [User(email=f"load{i}@example.com", username=f"load{i}") for i in range(args.pairs * 2)]
+        db.session.add_all(users)
+        db.session.flush()
+        swaps = [SwapRequest(user_id=users[2 * i].id) for i in range(args.pairs)]
+        db.session.add_all(swaps)
+        db.session.commit()
+        conversations = [(s.id, users[2 * i].id, users[2 * i + 1].id) for i, s in enumerate(swaps)]
+        before = db.session.query(Message).count()
+
+    clients = []
+    for swap_id, owner, partner in conversations:
+        for me in (owner, partner):
+            sock = socketio.test_client(app, flask_test_client=login(app, me))
+            sock.emit("join", {"swap_id": swap_id, "with": partner}, callback=True)
+            clients.append((sock, swap_id, partner))
+
+    def run(sock, swap_id, partner):
+        for n in range(args.messages):
+            sock.emit("message", {"swap_id": swap_id, "with": partner, "content": f"message {n}"})
+
+    threads = [threading.Thread(target=run, args=c) for c in clients]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    with app.app_context():
+        get_writer().flush()
+        elapsed = time.perf_counter() - started
+        stored = db.session.query(Message).count() - before
+        writer = get_writer()
+    sent = len(clients) * args.messages
+    delivered = sum(len([p for p in sock.get_received() if p["name"] == "message"]) for sock, _, _ in clients)
+    print(f"clients={len(clients)} sent={sent} stored={stored} delivered={delivered}")
+    print(f"{sent / elapsed:.0f} msgs/s over {elapsed:.2f}s, {writer.batches} insert batches")
+    if stored != sent:
+        sys.exit("persisted message count does not match messages sent")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,16 @@
-from flask import Blueprint, render_template, redirect, url_for, request, flash
-from flask_login import login_required
+from datetime import datetime
+from flask import Blueprint, render_template, redirect, url_for, request, flash, current_app, abort
+from flask_login import login_required, current_user
+from sqlalchemy import and_, or_, func
 from ..extensions import db
-from ..models import SwapRequest, Module
+from ..models import SwapRequest, Module, swap_give_modules, swap_want_modules, swap_loader_options
+from ..matching import cached_module_counts, get_swap_index, module_sets, overlap_scores
+from ..chains import get_chains
+from ..instrumentation import query_budget, render_metrics
+from ..pagination import make_cursor, parse_cursor
+from ..search import swap_search_clause
+from ..storage import no_body_limit
+from .. import exports, importer, moderation, verification
 
 
 admin_bp = Blueprint("admin", __name__, template_folder="templates")
@@ -12,8 +21,21 @@ def teacher_only():
     return session.get("role") == "teacher"
 
 
+def module_exists(*conditions):
+    clauses = []
+    for table in (swap_give_modules, swap_want_modules):
+        clauses.append(db.exists(
+            db.select(table.c.swap_id)
+            .join(Module, Module.id == table.c.module_id)
+            .where(table.c.swap_id == SwapRequest.id, *conditions)
+        ))
+    return or_(*clauses)
+
+
+
 @admin_bp.get("/swaps")
 @login_required
+@query_budget(10)
 def swaps():
     if not teacher_only():
         return redirect(url_for("auth.login"))
@@ -23,58 +45,171 @@ def swaps():
     priority = request.args.get("priority")
     search = (request.args.get("q") or "").strip().lower()
     expires_before = request.args.get("expires_before")
-    base = db.select(SwapRequest)
+    conditions = []
     if status:
-        base = base.filter_by(status=status)
+        conditions.append(SwapRequest.status == status)
     if priority:
-        base = base.filter_by(priority=priority)
-    swaps = db.session.execute(base.order_by(SwapRequest.created_at.desc())).scalars().all()
-    def matches_filters(s: SwapRequest) -> bool:
-        modules = list(s.giving) + list(s.wanting)
-        ok_dept = True
-        ok_year = True
-        if dept:
-            ok_dept = any((m.department or "").lower() == dept for m in modules)
-        if year:
-            try:
-                yr = int(year)
-                ok_year = any((m.year or 0) == yr for m in modules)
-            except Exception:
-                ok_year = True
-        ok_search = True
-        if search:
-            ok_search = any(search in (m.code or '').lower() or search in (m.name or '').lower() or search in (m.department or '').lower() for m in modules) or (search in (s.notes or '').lower())
-        ok_expiry = True
-        if expires_before and s.expires_at:
-            try:
-                from datetime import datetime
-                import datetime as dt
-                cutoff = datetime.strptime(expires_before, "%Y-%m-%d")
-                ok_expiry = s.expires_at <= cutoff
-            except Exception:
-                ok_expiry = True
-        return ok_dept and ok_year and ok_search and ok_expiry
-    swaps = [s for s in swaps if matches_filters(s)]
-    others = swaps
-    def score_for(s: SwapRequest) -> int:
-        s_g = {m.id for m in s.giving}
-        s_w = {m.id for m in s.wanting}
-        score = 0
-        for o in others:
-            if o.id == s.id:
-                continue
-            o_g = {m.id for m in o.giving}
-            o_w = {m.id for m in o.wanting}
-            score += len(o_w & s_g) + len(o_g & s_w)
-        return score
+        conditions.append(SwapRequest.priority == priority)
+    if dept:
+        conditions.append(module_exists(func.lower(Module.department) == dept))
+    if year:
+        try:
+            yr = int(year)
+            conditions.append(module_exists(Module.year == yr if yr else or_(Module.year == 0, Module.year.is_(None))))
+        except ValueError:
+            pass
+    if search and (clause := swap_search_clause(search)) is not None:
+        conditions.append(clause)
+    if expires_before:
+        try:
+            cutoff = datetime.strptime(expires_before, "%Y-%m-%d")
+            conditions.append(or_(SwapRequest.expires_at.is_(None), SwapRequest.expires_at <= cutoff))
+        except ValueError:
+            pass
+    page = db.select(SwapRequest).where(*conditions)
+    cursor = parse_cursor(request.args.get("after"))
+    if cursor:
+        created, sid = cursor
+        page = page.where(or_(
+            SwapRequest.created_at < created,
+            and_(SwapRequest.created_at == created, SwapRequest.id < sid),
+        ))
+    per_page = current_app.config["ADMIN_PAGE_SIZE"]
+    swaps = db.session.execute(
+        page.order_by(SwapRequest.created_at.desc(), SwapRequest.id.desc())
+        .limit(per_page + 1)
+        .options(*swap_loader_options(user=True))
+    ).scalars().all()
+    next_cursor = None
+    if len(swaps) > per_page:
+        swaps = swaps[:per_page]
+        next_cursor = make_cursor(swaps[-1])
+    sets = module_sets(swaps)
+    if conditions:
+        key = tuple(sorted((k, v) for k, v in request.args.items() if k != "after"))
+        counts = cached_module_counts(key, db.select(SwapRequest.id).where(*conditions),
+                                      current_app.config["ADMIN_COUNTS_TTL"])
+    else:
+        # Closed swaps are archived, so every live swap is in the index.
+        counts = get_swap_index().module_counts(set().union(*(g | w for g, w in sets.values())))
+    scores = overlap_scores(sets, *counts)
     annotated = []
-    from datetime import datetime
     for s in swaps:
         days_left = None
         if s.expires_at:
             days_left = (s.expires_at - datetime.utcnow()).days
-        annotated.append({"swap": s, "score": score_for(s), "days_left": days_left})
-    return render_template("admin/swaps.html", swaps=annotated)
+        annotated.append({"swap": s, "score": scores[s.id], "days_left": days_left})
+    args = {k: v for k, v in request.args.items() if k != "after"}
+    next_url = url_for("admin.swaps", after=next_cursor, **args) if next_cursor else None
+    first_url = url_for("admin.swaps", **args) if cursor else None
+    return render_template("admin/swaps.html", swaps=annotated, next_url=next_url, first_url=first_url)
+
+
+@admin_bp.get("/chains")
+@login_required
+@query_budget(10)
+def chains():
+    if not teacher_only():
+        return redirect(url_for("auth.login"))
+    limit = request.args.get("limit", 100, type=int)
+    found = get_chains()
+    shown = found[:limit]
+    swap_ids = {sid for c in shown for sid in c["swaps"]}
+    module_ids = {mid for c in shown for mid in c["modules"]}
+    swaps_by_id = {s.id: s for s in db.session.execute(
+        db.select(SwapRequest).filter(SwapRequest.id.in_(swap_ids)).options(*swap_loader_options(modules=False, user=True))
+    ).scalars()} if swap_ids else {}
+    modules_by_id = {m.id: m for m in db.session.execute(
+        db.select(Module).filter(Module.id.in_(module_ids))
+    ).scalars()} if module_ids else {}
+    rows = []
+    for c in shown:
+        if not all(sid in swaps_by_id for sid in c["swaps"]):
+            continue
+        links = [{"swap": swaps_by_id[sid], "module": modules_by_id.get(mid)} for sid, mid in zip(c["swaps"], c["modules"])]
+        rows.append({"length": c["length"], "links": links})
+    return render_template("admin/chains.html", chains=rows, total=len(found))
+
+
+@admin_bp.get("/metrics")
+def metrics():
+    # Teachers can read it in the browser; a scraper sends METRICS_TOKEN.
+    token = current_app.config["METRICS_TOKEN"]
+    scraper = token and request.headers.get("Authorization") == f"Bearer {token}"
+    if not scraper and not (current_user.is_authenticated and teacher_only()):
+        abort(403)
+    if "metrics" not in current_app.extensions:
+        abort(404)
+    return current_app.response_class(render_metrics(), mimetype="text/plain; version=0.0.4")
+
+
+@admin_bp.get("/documents")
+@login_required
+@query_budget(6)
+def documents():
+    if not teacher_only():
+        return redirect(url_for("auth.login"))
+    return render_template("admin/documents.html", claimed=verification.claimed(current_user.id),
+                           stats=verification.queue_stats())
+
+
+@admin_bp.post("/documents/claim")
+@login_required
+def claim_documents():
+    if not teacher_only():
+        return redirect(url_for("auth.login"))
+    ids = verification.claim(current_user.id, request.form.get("count", type=int))
+    if not ids:
+        flash("No documents waiting")
+    return redirect(url_for("admin.documents"))
+
+
+@admin_bp.post("/documents/review")
+@login_required
+def review_documents():
+    if not teacher_only():
+        return redirect(url_for("auth.login"))
+    action = request.form.get("action")
+    ids = [int(x) for x in request.form.getlist("ids")]
+    if action in {"approve", "reject"}:
+        count = verification.review(current_user.id, ids, "Approved" if action == "approve" else "Rejected",
+                                    current_app.config["ADMIN_BULK_CHUNK"])
+        flash(f"Reviewed {count} document(s)")
+    elif action == "release":
+        flash(f"Released {verification.release(current_user.id, ids)} document(s)")
+    return redirect(url_for("admin.documents"))
+
+
+@admin_bp.get("/export/<dataset>")
+@login_required
+def export(dataset: str):
+    if not teacher_only():
+        return redirect(url_for("auth.login"))
+    fmt = request.args.get("format", "ndjson")
+    if dataset not in exports.DATASETS or fmt not in exports.FORMATS:
+        abort(404)
+    return exports.respond(exports.dump(dataset, fmt), fmt, f"modswap-{dataset}-{datetime.utcnow():%Y%m%d}")
+
+
+@admin_bp.post("/modules/import")
+@no_body_limit
+@login_required
+def import_modules():
+    if not teacher_only():
+        return redirect(url_for("auth.login"))
+    file = request.files.get("catalogue")
+    if not file or file.filename == "":
+        flash("Select a CSV or JSON-lines catalogue to import")
+        return redirect(url_for("admin.swaps"))
+    fmt = request.form.get("format") or importer.guess_format(file.filename)
+    try:
+        result = importer.import_modules(file.stream, fmt, request.form.get("university") or None)
+    except (ValueError, UnicodeDecodeError) as e:
+        db.session.rollback()
+        flash(f"Import failed: {e}")
+        return redirect(url_for("admin.swaps"))
+    flash(f"Imported {result['imported']} module(s), skipped {result['skipped']} ({result['rows_per_sec']:.0f} rows/s)")
+    return redirect(url_for("admin.swaps"))
 
 
 @admin_bp.post("/swaps/<int:swap_id>/status")
@@ -83,14 +218,11 @@ def set_status(swap_id: int):
     if not teacher_only():
         return redirect(url_for("auth.login"))
     status = request.form.get("status")
-    s = db.session.get(SwapRequest, swap_id)
-    if s and status in {"Approved", "Rejected", "Needs Info"}:
-        if status in {"Approved", "Rejected"}:
-            db.session.delete(s)
-            db.session.commit()
-        else:
-            s.status = status
-            db.session.commit()
+    if status in {"Approved", "Rejected"}:
+        if moderation.archive_swaps([swap_id], status):
+            get_swap_index().discard(swap_id)
+    elif status == "Needs Info":
+        moderation.set_status([swap_id], status)
     return redirect(url_for("admin.swaps"))
 
 
@@ -101,15 +233,13 @@ def bulk():
         return redirect(url_for("auth.login"))
     action = request.form.get("action")
     ids = [int(x) for x in request.form.getlist("ids")]
-    rows = db.session.execute(db.select(SwapRequest).filter(SwapRequest.id.in_(ids))).scalars().all()
+    chunk_size = current_app.config["ADMIN_BULK_CHUNK"]
     if action in {"approve", "reject", "needs_info"}:
         if action in {"approve", "reject"}:
-            for r in rows:
-                db.session.delete(r)
-            db.session.commit()
+            status = "Approved" if action == "approve" else "Rejected"
+            count = moderation.archive_swaps(ids, status, chunk_size)
+            get_swap_index().discard_many(ids)
         else:
-            for r in rows:
-                r.status = "Needs Info"
-            db.session.commit()
-        flash(f"Updated {len(rows)} request(s)")
+            count = moderation.set_status(ids, "Needs Info", chunk_size)
+        flash(f"Updated {count} request(s)")
     return redirect(url_for("admin.swaps"))
@@ -0,0 +1,50 @@
+import json
+from flask import current_app
+from sqlalchemy import select
+from .extensions import db
+from .matching import open_clause
+from .models import SwapRequest
+from . import dispatch, inbox, stats
+
+
+def notify_matches(swap, index):
+    """Write one ``match`` notification per open swap that ``swap`` mutually matches.
+
+    One-sided overlaps count only from ``MATCH_ALERT_MIN_SCORE`` shared
+    modules up. ``swap`` must already be in ``index``. Owners who asked for
+    email alerts on the matched request also get a digest queued.
+    """
+    matches = index.matches_for(
+        swap.id, current_app.config["MATCH_ALERT_LIMIT"], current_app.config["MATCH_ALERT_MIN_SCORE"]
+    )
+    if matches:
+        # Another process may have closed a match since this index last caught up.
+        live = set(db.session.execute(
+            select(SwapRequest.id).where(SwapRequest.id.in_([sid for sid, _, _ in matches]), open_clause())
+        ).scalars())
+        index.discard_many([sid for sid, _, _ in matches if sid not in live])
+        matches = [m for m in matches if m[0] in live]
+    if not matches:
+        return 0
+    rows = [
+        {
+            "user_id": entry.user_id,
+            "type": "match",
+            "payload": json.dumps({
+                "message": f"New swap request #{swap.id} matches your request #{sid}",
+                "swap_id": swap.id,
+                "matched_swap_id": sid,
+                "score": score,
+            }),
+        }
+        for sid, score, entry in matches
+    ]
+    counts = {swap.user_id: {"matches": len(matches)}}
+    for _, _, entry in matches:
+        counts.setdefault(entry.user_id, {"matches": 0})["matches"] += 1
+    stats.add(db.session, counts)
+    inbox.notify(rows)
+    emailed = {entry.user_id for _, _, entry in matches if entry.alerts_email}
+    if emailed:
+        dispatch.enqueue(emailed)
+    return len(rows)
@@ -0,0 +1,125 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app, render_template
+from markupsafe import Markup
+from sqlalchemy import select
+from .extensions import db, get_redis
+from .models import Module
+from . import instrumentation
+
+
+class LRUCache:
+    def __init__(self, maxsize=32):
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self.data:
+                return None
+            self.data.move_to_end(key)
+            return self.data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self.data[key] = value
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self.data.clear()
+
+
+class Catalogue:
+    """Module catalogue artefacts cached per catalogue version.
+
+    The version lives in Redis when one is configured, so a bump from any
+    process (an import run from the CLI, say) invalidates every worker.
+    Without Redis it is per process and entries also expire after ``ttl``.
+    """
+
+    prefix = "modswap:catalogue"
+
+    def __init__(self, maxsize=32, ttl=300, redis=None):
+        self.lru = LRUCache(maxsize)
+        self.ttl = ttl
+        self.redis = redis
+        self.local_version = 0
+        self.hits = 0
+        self.misses = 0
+
+    def version(self):
+        if self.redis is not None:
+            return int(self.redis.get(f"{self.prefix}:version") or 0)
+        return self.local_version
+
+    def bump(self):
+        if self.redis is not None:
+            self.redis.incr(f"{self.prefix}:version")
+        else:
+            self.local_version += 1
+        self.lru.clear()
+
+    def get(self, name, build):
+        version = self.version()
+        cached = self.lru.get((version, name))
+        if cached and time.monotonic() - cached[0] < self.ttl:
+            self.hits += 1
+            return cached[1]
+        self.misses += 1
+        key = f"{self.prefix}:{version}:{name}"
+        raw = self.redis.get(key) if self.redis is not None else None
+        if raw is not None:
+            value = json.loads(raw)
+        else:
+            value = build()
+            if self.redis is not None:
+                self.redis.set(key, json.dumps(value), ex=self.ttl)
+        self.lru.set((version, name), (time.monotonic(), value))
+        return value
+
+
+def get_catalogue():
+    catalogue = current_app.extensions.get("catalogue")
+    if catalogue is None:
+        catalogue = Catalogue(
+            current_app.config["CATALOGUE_CACHE_SIZE"], current_app.config["CATALOGUE_TTL"], get_redis()
+        )
+        catalogue = current_app.extensions.setdefault("catalogue", catalogue)
+        instrumentation.track_cache("catalogue", catalogue)
+    return catalogue
+
+
+def bump():
+    get_catalogue().bump()
+
+
+def modules():
+    def build():
+        rows = db.session.execute(
+            select(Module.id, Module.code, Module.name, Module.department, Module.year, Module.university)
+            .order_by(Module.department, Module.year, Module.code)
+        ).all()
+        return [dict(row._mapping) for row in rows]
+    return get_catalogue().get("modules", build)
+
+
+def options(field):
+    # The checkbox list for one side of the create form, rendered once per
+    # catalogue version instead of on every page load.
+    return Markup(get_catalogue().get(
+        f"options:{field}", lambda: render_template("swaps/_module_options.html", modules=modules(), field=field)
+    ))
+
+
+def payload():
+    def build():
+        body = json.dumps(modules(), separators=(",", ":"))
+        return {"body": body, "etag": hashlib.sha1(body.encode()).hexdigest(), "last_modified": int(time.time())}
+    return get_catalogue().get("json", build)
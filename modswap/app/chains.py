@@ -0,0 +1,176 @@
+import threading
+import time
+from collections import deque
+from flask import current_app
+from .matching import get_swap_index
+
+
+def _build_graph(entries):
+    # Each swap is an edge from a module it wants to a module it gives, so an
+    # exchange cycle between swaps is a cycle in this (small) module graph.
+    out = {}
+    inc = {}
+    alive = {}
+    for sid in sorted(entries):
+        e = entries[sid]
+        for w in e.wants:
+            for g in e.gives:
+                if w == g:
+                    continue
+                out.setdefault(w, {}).setdefault(g, deque()).append(sid)
+                inc.setdefault(g, set()).add(w)
+                alive[(w, g)] = alive.get((w, g), 0) + 1
+    return out, inc, alive
+
+
+def _shortest_path(out, inc, src, dst, max_edges):
+    fwd = [{src}]
+    bwd = [{dst}]
+    seen_f = {src: 0}
+    seen_b = {dst: 0}
+    while (len(fwd) - 1) + (len(bwd) - 1) < max_edges:
+        grow_fwd = sum(len(out.get(x, ())) for x in fwd[-1]) <= sum(len(inc.get(x, ())) for x in bwd[-1])
+        nxt = set()
+        if grow_fwd:
+            for x in fwd[-1]:
+                nxt.update(out.get(x, ()))
+            nxt.difference_update(seen_f)
+            if not nxt:
+                return None
+            for x in nxt:
+                seen_f[x] = len(fwd)
+            fwd.append(nxt)
+            meet = nxt.intersection(seen_b)
+        else:
+            for x in bwd[-1]:
+                nxt.update(inc.get(x, ()))
+            nxt.difference_update(seen_b)
+            if not nxt:
+                return None
+            for x in nxt:
+                seen_b[x] = len(bwd)
+            bwd.append(nxt)
+            meet = nxt.intersection(seen_f)
+        if meet:
+            mid = min(meet, key=lambda m: seen_f[m] + seen_b[m])
+            head = [mid]
+            for level in range(seen_f[mid] - 1, -1, -1):
+                head.append(next(iter(inc[head[-1]] & fwd[level])))
+            tail = [mid]
+            for level in range(seen_b[mid] - 1, -1, -1):
+                tail.append(next(iter(out[tail[-1]].keys() & bwd[level])))
+            return head[::-1] + tail[1:]
+    return None
+
+
+def find_chains(entries, max_len=4):
+    """Greedily pack disjoint exchange cycles of at most ``max_len`` swaps.
+
+    ``entries`` maps swap id to an object with ``user_id``, ``gives`` and
+    ``wants``. Older swaps are served first. Each chain lists its swaps in
+    order together with the module each one hands to the next.
+    """
+    out, inc, alive = _build_graph(entries)
+    used = set()
+    dead = set()
+    chains = []
+
+    def retire(sid):
+        used.add(sid)
+        e = entries[sid]
+        for w in e.wants:
+            for g in e.gives:
+                key = (w, g)
+                if key not in alive:
+                    continue
+                alive[key] -= 1
+                if alive[key] == 0:
+                    del alive[key]
+                    del out[w][g]
+                    inc[g].discard(w)
+
+    def pick(a, b, users):
+        queue = out[a][b]
+        while queue and queue[0] in used:
+            queue.popleft()
+        for sid in queue:
+            if sid not in used and entries[sid].user_id not in users:
+                return sid
+        return None
+
+    for sid in sorted(entries):
+        if sid in used:
+            continue
+        e = entries[sid]
+        for w in e.wants:
+            found = None
+            for g in e.gives:
+                if w == g or (g, w) in dead:
+                    continue
+                path = _shortest_path(out, inc, g, w, max_len - 1)
+                if path is None:
+                    dead.add((g, w))
+                    continue
+                users = {e.user_id}
+                swaps = [sid]
+                for a, b in zip(path, path[1:]):
+                    nxt = pick(a, b, users)
+                    if nxt is None:
+                        break
+                    users.add(entries[nxt].user_id)
+                    swaps.append(nxt)
+                else:
+                    found = {"swaps": swaps, "modules": path, "length": len(swaps)}
+                    break
+            if found:
+                for s in found["swaps"]:
+                    retire(s)
+                chains.append(found)
+                break
+    return chains
+
+
+class ChainCache:
+    """The last packing of exchange chains, recomputed at most once per interval.
+
+    One caller at a time recomputes; while it does, the others keep getting
+    the previous result instead of each repeating the same search.
+    """
+
+    def __init__(self):
+        self.key = None
+        self.chains = None
+        self.computed_at = 0.0
+        self._lock = threading.Lock()
+
+    def fresh(self, key, interval):
+        return self.chains is not None and (
+            self.key == key or (self.key[1] == key[1] and time.monotonic() - self.computed_at < interval)
+        )
+
+    def get(self, index, max_len, interval):
+        if self.fresh((index.version, max_len), interval):
+            return self.chains
+        if not self._lock.acquire(blocking=self.chains is None):
+            return self.chains
+        try:
+            if self.fresh((index.version, max_len), interval):
+                return self.chains
+            with index._lock:
+                version = index.version
+                entries = dict(index.entries)
+            chains = find_chains(entries, max_len=max_len)
+            for chain in chains:
+                chain["users"] = [entries[sid].user_id for sid in chain["swaps"]]
+            self.key, self.chains, self.computed_at = (version, max_len), chains, time.monotonic()
+            return chains
+        finally:
+            self._lock.release()
+
+
+def get_chains():
+    index = get_swap_index()
+    cache = current_app.extensions.get("swap_chains")
+    if cache is None:
+        cache = current_app.extensions.setdefault("swap_chains", ChainCache())
+    return cache.get(index, current_app.config["CHAIN_MAX_LEN"], current_app.config["CHAIN_REFRESH_INTERVAL"])
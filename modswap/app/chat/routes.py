@@ -1,10 +1,134 @@
-from flask import Blueprint, render_template
-from flask_login import login_required
+from flask import Blueprint, render_template, request, jsonify, abort, current_app
+from flask_login import login_required, current_user
+from flask_socketio import join_room, emit
+from sqlalchemy import func, or_
+from ..extensions import db, socketio
+from ..models import Message, SwapArchive, SwapRequest
+from ..messaging import get_writer, conversation_room, history
+from ..pagination import next_cursor, page_limit, parse_cursor
+from .. import inbox
 
 chat_bp = Blueprint("chat", __name__, template_folder="templates")
 
 
+def swap_owner(swap_id):
+    """``(owner id, archived)`` for a live or archived swap, or None.
+
+    Conversations outlive their swap: once it is resolved the history stays
+    readable but nobody can post to it.
+    """
+    owner = db.session.execute(db.select(SwapRequest.user_id).where(SwapRequest.id == swap_id)).scalar()
+    if owner is not None:
+        return owner, False
+    owner = db.session.execute(db.select(SwapArchive.user_id).where(SwapArchive.id == swap_id)).scalar()
+    return (owner, True) if owner is not None else None
+
+
+def counterpart_for(owner_id, other_id):
+    # A conversation is one swap plus the non-owner taking part in it.
+    if owner_id == current_user.id:
+        return other_id if other_id and other_id != current_user.id else None
+    return current_user.id
+
+
+def payload_ids(data):
+    # ``swap_id`` and the optional ``with`` of a socket event as ints, or
+    # None when the client sent something else.
+    try:
+        other = data.get("with")
+        return int(data["swap_id"]), int(other) if other is not None else None
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return None
+
+
 @chat_bp.get("/")
 @login_required
 def index():
-    return render_template("chat/thread.html")
\ No newline at end of file
+    me = current_user.id
+    other = db.case((Message.sender_id == me, Message.receiver_id), else_=Message.sender_id)
+    rows = db.session.execute(
+        db.select(Message.swap_id, other.label("other_id"), func.max(Message.created_at).label("last_at"))
+        .where(or_(Message.sender_id == me, Message.receiver_id == me))
+        .group_by(Message.swap_id, other)
+        .order_by(func.max(Message.created_at).desc())
+        .limit(50)
+    ).all()
+    return render_template("chat/index.html", conversations=rows)
+
+
+@chat_bp.get("/<int:swap_id>")
+@login_required
+def thread(swap_id: int):
+    owner_id, archived = swap_owner(swap_id) or abort(404)
+    counterpart = counterpart_for(owner_id, request.args.get("with", type=int))
+    if counterpart is None:
+        abort(400)
+    other_id = owner_id if counterpart == current_user.id else counterpart
+    return render_template("chat/thread.html", swap_id=swap_id, counterpart=counterpart, other_id=other_id,
+                           archived=archived)
+
+
+@chat_bp.get("/<int:swap_id>/messages")
+@login_required
+def messages(swap_id: int):
+    owner_id, _ = swap_owner(swap_id) or abort(404)
+    counterpart = counterpart_for(owner_id, request.args.get("with", type=int))
+    if counterpart is None:
+        abort(400)
+    get_writer().flush()
+    limit = page_limit(request.args.get("limit", type=int), 50, 200)
+    rows = history(swap_id, owner_id, counterpart, parse_cursor(request.args.get("before")), limit)
+    return jsonify({
+        "messages": [
+            {"id": m.id, "sender_id": m.sender_id, "content": m.content, "created_at": m.created_at.isoformat()}
+            for m in rows
+        ],
+        "next": next_cursor(rows, limit),
+    })
+
+
+@socketio.on("connect")
+def on_connect(auth=None):
+    if not current_user.is_authenticated:
+        return False
+    join_room(inbox.user_room(current_user.id))
+
+
+@socketio.on("join")
+def on_join(data):
+    ids = payload_ids(data)
+    if ids is None or not current_user.is_authenticated:
+        return {"ok": False}
+    swap_id, other_id = ids
+    owner = swap_owner(swap_id)
+    if owner is None or owner[1]:
+        return {"ok": False}
+    counterpart = counterpart_for(owner[0], other_id)
+    if counterpart is None:
+        return {"ok": False}
+    join_room(conversation_room(swap_id, counterpart))
+    return {"ok": True}
+
+
+@socketio.on("message")
+def on_message(data):
+    ids = payload_ids(data)
+    if ids is None or not current_user.is_authenticated or not isinstance(data.get("content"), str):
+        return {"ok": False}
+    content = data["content"].strip()
+    swap_id, other_id = ids
+    owner = swap_owner(swap_id)
+    if not content or owner is None or owner[1]:
+        return {"ok": False}
+    counterpart = counterpart_for(owner[0], other_id)
+    if counterpart is None:
+        return {"ok": False}
+    receiver = owner[0] if counterpart == current_user.id else counterpart
+    row = get_writer().submit(swap_id, current_user.id, receiver, content[:current_app.config["CHAT_MAX_LENGTH"]])
+    emit("message", {
+        "swap_id": swap_id,
+        "sender_id": row["sender_id"],
+        "content": row["content"],
+        "created_at": row["created_at"].isoformat(),
+    }, to=conversation_room(swap_id, counterpart))
+    return {"ok": True}
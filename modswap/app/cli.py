@@ -0,0 +1,77 @@
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from .extensions import db
+from . import dispatch, exports, importer, migrations, moderation, seed
+
+
+modswap_cli = AppGroup("modswap", help="ModSwap maintenance commands.")
+
+
+@modswap_cli.command("migrate")
+def migrate_command():
+    """Apply pending schema migrations."""
+    before = migrations.current_version(db.engine)
+    applied = migrations.migrate(db.engine)
+    for version, name in applied:
+        click.echo(f"applied {version:03d} {name}")
+    if not applied:
+        click.echo(f"schema is up to date at version {before}")
+
+
+@modswap_cli.command("seed")
+def seed_command():
+    """Insert or update the demo modules and accounts."""
+    result = seed.run()
+    click.echo(
+        f"modules added: {result['modules']}, users created: {result['users_created']}, "
+        f"users updated: {result['users_updated']}"
+    )
+
+
+@modswap_cli.command("import-modules")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--format", "fmt", type=click.Choice(importer.FORMATS), help="Defaults to the file extension.")
+@click.option("--university", help="University for rows that do not name one.")
+@click.option("--batch-size", default=1000, show_default=True)
+def import_modules_command(path, fmt, university, batch_size):
+    """Stream a CSV or JSON-lines module catalogue into the modules table."""
+    with open(path, encoding="utf-8-sig", newline="") as stream:
+        result = importer.import_modules(stream, fmt or importer.guess_format(path), university, batch_size)
+    click.echo(
+        f"{result['imported']} module(s) upserted, {result['skipped']} skipped "
+        f"in {result['seconds']:.2f}s ({result['rows_per_sec']:.0f} rows/s)"
+    )
+
+
+@modswap_cli.command("dispatch")
+@click.option("--workers", type=int, help="Defaults to DISPATCH_WORKERS.")
+@click.option("--once", is_flag=True, help="Send whatever is due and exit.")
+def dispatch_command(workers, once):
+    """Send queued notification digests."""
+    app = current_app._get_current_object()
+    dispatcher = dispatch.Dispatcher(app, workers or app.config["DISPATCH_WORKERS"])
+    if once:
+        while dispatcher.run_once():
+            pass
+        click.echo(f"sent {dispatcher.sent}, retrying {dispatcher.retried}, failed {dispatcher.failed}")
+        return
+    click.echo(f"dispatching with {dispatcher.workers} worker(s)")
+    dispatcher.run()
+
+
+@modswap_cli.command("expire")
+def expire_command():
+    """Archive open swap requests past their expiry date as Expired."""
+    ids = moderation.sweep_expired()
+    click.echo(f"expired {len(ids)} swap request(s)")
+
+
+@modswap_cli.command("export")
+@click.argument("dataset", type=click.Choice(sorted(exports.DATASETS)))
+@click.option("--format", "fmt", type=click.Choice(sorted(exports.FORMATS)), default="ndjson")
+@click.option("--output", type=click.File("w"), default="-", help="File to write, stdout by default.")
+def export_command(dataset, fmt, output):
+    """Stream a full table dump as NDJSON or CSV."""
+    for chunk in exports.dump(dataset, fmt):
+        output.write(chunk)
@@ -0,0 +1,337 @@
+import json
+import logging
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from flask import current_app
+from flask_mail import Message as MailMessage
+from sqlalchemy import delete, or_, select, text, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from .extensions import db, get_redis, mail, socketio
+from .models import DispatchJob, Notification, User
+
+
+log = logging.getLogger(__name__)
+
+
+class SMTPTransport:
+    def send(self, to, subject, body):
+        mail.send(MailMessage(subject, recipients=[to], body=body))
+
+
+class ResendTransport:
+    url = "https://api.resend.com/emails"
+
+    def __init__(self, api_key, sender, timeout=10):
+        self.api_key = api_key
+        self.sender = sender
+        self.timeout = timeout
+
+    def send(self, to, subject, body):
+        data = json.dumps({"from": self.sender, "to": [to], "subject": subject, "text": body}).encode()
+        req = urllib.request.Request(self.url, data=data, method="POST", headers={
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+        })
+        with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+            resp.read()
+
+
+class MemoryTransport:
+    """Local stand-in for a mail server: keeps sent mail in ``outbox``.
+
+    ``delay`` simulates a slow server and the first ``failures`` sends raise,
+    which is enough to exercise the worker pool and the retry path.
+    """
+
+    def __init__(self, delay=0.0, failures=0):
+        self.delay = delay
+        self.failures = failures
+        self.outbox = []
+        self.attempts = 0
+        self._lock = threading.Lock()
+
+    def send(self, to, subject, body):
+        time.sleep(self.delay)
+        with self._lock:
+            self.attempts += 1
+            if self.failures > 0:
+                self.failures -= 1
+                raise ConnectionError("simulated mail server failure")
+            self.outbox.append({"to": to, "subject": subject, "body": body})
+
+
+def get_transport():
+    transport = current_app.extensions.get("mail_transport")
+    if transport is None:
+        kind = current_app.config["MAIL_TRANSPORT"]
+        if kind == "memory":
+            transport = MemoryTransport()
+        elif kind == "resend":
+            transport = ResendTransport(current_app.config["RESEND_API_KEY"], current_app.config["MAIL_DEFAULT_SENDER"])
+        else:
+            transport = SMTPTransport()
+        transport = current_app.extensions.setdefault("mail_transport", transport)
+    return transport
+
+
+class Job:
+    __slots__ = ("key", "user_id", "attempts")
+
+    def __init__(self, key, user_id, attempts):
+        self.key = key
+        self.user_id = user_id
+        self.attempts = attempts
+
+
+class TableQueue:
+    """Digest jobs in ``dispatch_jobs``, at most one unclaimed job per user.
+
+    A claim sets ``locked_until``; a worker that dies mid-send lets the lease
+    run out and the job is claimed again.
+    """
+
+    WAITING = text("locked_until IS NULL AND due_at IS NOT NULL")
+
+    def push(self, user_ids, due_at):
+        user_ids = set(user_ids)
+        if not user_ids:
+            return 0
+        # The partial unique index decides, so two concurrent pushes for one
+        # user cannot both insert a waiting job.
+        dialect = postgresql if db.engine.dialect.name == "postgresql" else sqlite
+        stmt = dialect.insert(DispatchJob).values([
+            {"user_id": uid, "due_at": due_at, "attempts": 0, "created_at": datetime.utcnow()}
+            for uid in sorted(user_ids)
+        ])
+        stmt = stmt.on_conflict_do_nothing(index_elements=["user_id"], index_where=self.WAITING)
+        pushed = len(db.session.execute(stmt.returning(DispatchJob.id)).all())
+        db.session.commit()
+        return pushed
+
+    def claim(self, limit, lease):
+        now = datetime.utcnow()
+        due = (
+            select(DispatchJob.id)
+            .where(
+                DispatchJob.due_at <= now,
+                or_(DispatchJob.locked_until.is_(None), DispatchJob.locked_until < now),
+            )
+            .order_by(DispatchJob.due_at)
+            .limit(limit)
+        )
+        if db.engine.dialect.name == "postgresql":
+            due = due.with_for_update(skip_locked=True)
+        rows = db.session.execute(
+            update(DispatchJob)
+            .where(DispatchJob.id.in_(due.scalar_subquery()))
+            .values(locked_until=now + timedelta(seconds=lease))
+            .returning(DispatchJob.id, DispatchJob.user_id, DispatchJob.attempts)
+            .execution_options(synchronize_session=False)
+        ).all()
+        db.session.commit()
+        return [Job(jid, uid, attempts) for jid, uid, attempts in rows]
+
+    def done(self, job):
+        db.session.execute(delete(DispatchJob).where(DispatchJob.id == job.key))
+        db.session.commit()
+
+    def retry(self, job, due_at, error):
+        try:
+            db.session.execute(
+                update(DispatchJob).where(DispatchJob.id == job.key)
+                .values(due_at=due_at, locked_until=None, attempts=job.attempts + 1, last_error=error)
+            )
+            db.session.commit()
+        except IntegrityError:
+            # A push while this job was in flight already waits with the same
+            # digest; that job sends it.
+            db.session.rollback()
+            self.done(job)
+
+    def fail(self, job, error):
+        # Kept with no due date so failed digests can be inspected.
+        db.session.execute(
+            update(DispatchJob).where(DispatchJob.id == job.key)
+            .values(due_at=None, locked_until=None, attempts=job.attempts + 1, last_error=error)
+        )
+        db.session.commit()
+
+
+def _epoch(moment):
+    return moment.replace(tzinfo=timezone.utc).timestamp()
+
+
+class RedisQueue:
+    """Digest jobs in a sorted set of user ids scored by due time."""
+
+    CLAIM = """
+    local ids = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+    for _, id in ipairs(ids) do redis.call('ZADD', KEYS[1], ARGV[3], id) end
+    return ids
+    """
+
+    def __init__(self, client, prefix="modswap:dispatch"):
+        self.client = client
+        self.due_key = f"{prefix}:due"
+        self.attempts_key = f"{prefix}:attempts"
+        self.failed_key = f"{prefix}:failed"
+        self._claim = client.register_script(self.CLAIM)
+
+    def push(self, user_ids, due_at):
+        mapping = {str(uid): _epoch(due_at) for uid in set(user_ids)}
+        return self.client.zadd(self.due_key, mapping, nx=True) if mapping else 0
+
+    def claim(self, limit, lease):
+        now = time.time()
+        ids = self._claim(keys=[self.due_key], args=[now, limit, now + lease])
+        if not ids:
+            return []
+        attempts = self.client.hmget(self.attempts_key, ids)
+        return [Job(uid, int(uid), int(n or 0)) for uid, n in zip(ids, attempts)]
+
+    def done(self, job):
+        self.client.pipeline().zrem(self.due_key, job.key).hdel(self.attempts_key, job.key).execute()
+
+    def retry(self, job, due_at, error):
+        self.client.pipeline().zadd(self.due_key, {job.key: _epoch(due_at)}, xx=True) \
+            .hset(self.attempts_key, job.key, job.attempts + 1).execute()
+
+    def fail(self, job, error):
+        self.client.pipeline().zrem(self.due_key, job.key).hdel(self.attempts_key, job.key) \
+            .hset(self.failed_key, job.key, error).execute()
+
+
+def get_queue():
+    queue = current_app.extensions.get("dispatch_queue")
+    if queue is None:
+        client = get_redis()
+        queue = RedisQueue(client) if client is not None else TableQueue()
+        queue = current_app.extensions.setdefault("dispatch_queue", queue)
+    return queue
+
+
+def enqueue(user_ids):
+    """Schedule a digest for each user; the only work a web request does."""
+    due_at = datetime.utcnow() + timedelta(seconds=current_app.config["MAIL_DIGEST_DELAY"])
+    pushed = get_queue().push(user_ids, due_at)
+    if current_app.config["DISPATCH_IN_PROCESS"]:
+        get_dispatcher().start()
+    return pushed
+
+
+def describe(notification):
+    try:
+        payload = json.loads(notification.payload or "{}")
+    except ValueError:
+        payload = {}
+    if notification.type == "deadline":
+        text = f"Deadline {payload.get('date') or ''} {payload.get('department') or ''}".strip()
+        return f"{text}: {payload['note']}" if payload.get("note") else text
+    if payload.get("message"):
+        return payload["message"]
+    return notification.type.replace("_", " ").capitalize()
+
+
+def render_digest(notifications):
+    count = len(notifications)
+    subject = f"ModSwap: {count} new notification{'s' if count != 1 else ''}"
+    lines = [f"- {describe(n)} ({n.created_at:%d %b %H:%M})" for n in notifications]
+    return subject, "You have new activity on ModSwap:\n\n" + "\n".join(lines) + "\n"
+
+
+class Dispatcher:
+    """Claims due digest jobs and sends them from a pool of worker threads."""
+
+    def __init__(self, app, workers=4, batch_size=50, poll=1.0):
+        self.app = app
+        self.workers = workers
+        self.batch_size = batch_size
+        self.poll = poll
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="dispatch")
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+        self.started = False
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if not self.started:
+                self.started = True
+                socketio.start_background_task(self.run)
+
+    def run_once(self):
+        with self.app.app_context():
+            jobs = get_queue().claim(self.batch_size, self.app.config["DISPATCH_LEASE"])
+        list(self.pool.map(self.deliver, jobs))
+        return len(jobs)
+
+    def run(self, stop=None):
+        while stop is None or not stop.is_set():
+            try:
+                claimed = self.run_once()
+            except Exception:
+                log.exception("dispatch loop failed")
+                claimed = 0
+            if not claimed:
+                time.sleep(self.poll)
+
+    def deliver(self, job):
+        with self.app.app_context():
+            queue = get_queue()
+            config = self.app.config
+            user = db.session.get(User, job.user_id)
+            if user is None or not user.email_notifications or not user.email:
+                queue.done(job)
+                return
+            notifications = db.session.execute(
+                select(Notification)
+                .where(Notification.user_id == job.user_id, Notification.emailed_at.is_(None))
+                .order_by(Notification.created_at.desc(), Notification.id.desc())
+                .limit(config["MAIL_DIGEST_MAX"])
+            ).scalars().all()
+            if notifications:
+                subject, body = render_digest(notifications)
+                try:
+                    get_transport().send(user.email, subject, body)
+                except Exception as exc:
+                    error = f"{type(exc).__name__}: {exc}"
+                    if job.attempts + 1 >= config["MAIL_MAX_ATTEMPTS"]:
+                        log.error("giving up on digest for user %s: %s", job.user_id, error)
+                        queue.fail(job, error)
+                        self.failed += 1
+                    else:
+                        delay = config["MAIL_RETRY_BASE"] * 2 ** job.attempts
+                        queue.retry(job, datetime.utcnow() + timedelta(seconds=delay), error)
+                        self.retried += 1
+                    return
+                db.session.execute(
+                    update(Notification)
+                    .where(Notification.id.in_([n.id for n in notifications]))
+                    .values(emailed_at=datetime.utcnow())
+                )
+                db.session.commit()
+                self.sent += 1
+            queue.done(job)
+            # Anything that arrived while this digest was in flight was not
+            # picked up above and its push may have been absorbed by this job.
+            pending = db.session.execute(
+                select(Notification.id)
+                .where(Notification.user_id == job.user_id, Notification.emailed_at.is_(None))
+                .limit(1)
+            ).first()
+            if pending:
+                queue.push([job.user_id], datetime.utcnow() + timedelta(seconds=config["MAIL_DIGEST_DELAY"]))
+
+
+def get_dispatcher():
+    dispatcher = current_app.extensions.get("dispatcher")
+    if dispatcher is None:
+        app = current_app._get_current_object()
+        dispatcher = Dispatcher(app, app.config["DISPATCH_WORKERS"])
+        dispatcher = current_app.extensions.setdefault("dispatcher", dispatcher)
+    return dispatcher
@@ -0,0 +1,128 @@
+import csv
+import io
+import json
+from datetime import date, datetime
+from flask import Response, current_app, stream_with_context
+from sqlalchemy import or_, select
+from .extensions import db
+from .models import (
+    Document, Message, Module, Notification, Rating, SwapArchive, SwapRequest, User,
+    swap_give_modules, swap_want_modules, user_modules, user_wishlist,
+)
+
+
+FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+# Everything on the user row except credentials.
+USER_COLUMNS = [c for c in User.__table__.c if c.name != "password_hash"]
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"cannot serialise {type(value).__name__}")
+
+
+def batches(stmt, size=None, enrich=None):
+    """Yield lists of row dicts, ``size`` at a time, from a server-side cursor.
+
+    ``enrich`` receives each batch before it is yielded, so per-batch lookups
+    cost one query per ``size`` rows rather than one per row.
+    """
+    size = size or current_app.config["EXPORT_BATCH_SIZE"]
+    result = db.session.execute(stmt.execution_options(yield_per=size))
+    for partition in result.partitions():
+        rows = [dict(row._mapping) for row in partition]
+        if enrich is not None:
+            enrich(rows)
+        yield rows
+
+
+def with_module_ids(rows):
+    ids = [row["id"] for row in rows]
+    for key, table in (("give_module_ids", swap_give_modules), ("want_module_ids", swap_want_modules)):
+        found = {}
+        for swap_id, module_id in db.session.execute(
+            select(table.c.swap_id, table.c.module_id).where(table.c.swap_id.in_(ids)).order_by(table.c.module_id)
+        ):
+            found.setdefault(swap_id, []).append(module_id)
+        for row in rows:
+            row[key] = found.get(row["id"], [])
+
+
+def decode_module_ids(rows):
+    for row in rows:
+        row["give_module_ids"] = json.loads(row["give_module_ids"] or "[]")
+        row["want_module_ids"] = json.loads(row["want_module_ids"] or "[]")
+
+
+DATASETS = {
+    "swaps": (lambda: select(SwapRequest.__table__).order_by(SwapRequest.id), with_module_ids),
+    "archive": (lambda: select(SwapArchive.__table__).order_by(SwapArchive.id), decode_module_ids),
+    "messages": (lambda: select(Message.__table__).order_by(Message.id), None),
+    "ratings": (lambda: select(Rating.__table__).order_by(Rating.id), None),
+}
+
+
+def ndjson(chunks, kind=None):
+    for rows in chunks:
+        if kind is not None:
+            rows = [{"record": kind, **row} for row in rows]
+        yield "".join(json.dumps(row, default=_default) + "\n" for row in rows)
+
+
+def csv_rows(chunks):
+    buffer = io.StringIO()
+    writer = None
+    for rows in chunks:
+        for row in rows:
+            if writer is None:
+                writer = csv.DictWriter(buffer, fieldnames=list(row))
+                writer.writeheader()
+            writer.writerow({
+                k: json.dumps(v) if isinstance(v, list) else _default(v) if isinstance(v, (datetime, date)) else v
+                for k, v in row.items()
+            })
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def respond(body, fmt, filename):
+    response = Response(stream_with_context(body), mimetype=FORMATS[fmt])
+    response.headers["Content-Disposition"] = f'attachment; filename="{filename}.{fmt}"'
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+
+def dump(dataset, fmt):
+    """Every row of one admin dataset as an NDJSON or CSV text stream."""
+    build, enrich = DATASETS[dataset]
+    chunks = batches(build(), enrich=enrich)
+    return ndjson(chunks) if fmt == "ndjson" else csv_rows(chunks)
+
+
+def user_export(user_id):
+    """One NDJSON line per row the user owns or takes part in, tagged by ``record``."""
+    profile = db.session.execute(select(*USER_COLUMNS).where(User.id == user_id)).mappings().one()
+    record = dict(profile)
+    for key, table in (("modules", user_modules), ("wishlist", user_wishlist)):
+        record[key] = [dict(m) for m in db.session.execute(
+            select(Module.code, Module.name).join(table, table.c.module_id == Module.id).where(table.c.user_id == user_id)
+        ).mappings()]
+    yield json.dumps({"record": "profile", **record}, default=_default) + "\n"
+    sections = (
+        ("swap", select(SwapRequest.__table__).where(SwapRequest.user_id == user_id).order_by(SwapRequest.id),
+         with_module_ids),
+        ("archived_swap", select(SwapArchive.__table__).where(SwapArchive.user_id == user_id).order_by(SwapArchive.id),
+         decode_module_ids),
+        ("message", select(Message.__table__)
+         .where(or_(Message.sender_id == user_id, Message.receiver_id == user_id)).order_by(Message.id), None),
+        ("notification", select(Notification.__table__).where(Notification.user_id == user_id)
+         .order_by(Notification.id), None),
+        ("document", select(Document.__table__).where(Document.user_id == user_id).order_by(Document.id), None),
+        ("rating", select(Rating.__table__)
+         .where(or_(Rating.rater_id == user_id, Rating.receiver_id == user_id)).order_by(Rating.id), None),
+    )
+    for kind, stmt, enrich in sections:
+        yield from ndjson(batches(stmt, enrich=enrich), kind)
@@ -1,4 +1,5 @@
 import os
+from flask import current_app
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from flask_bcrypt import Bcrypt
@@ -9,4 +10,16 @@ db = SQLAlchemy()
 login_manager = LoginManager()
 bcrypt = Bcrypt()
 mail = Mail()
-socketio = SocketIO()
\ No newline at end of file
+socketio = SocketIO()
+
+
+def get_redis():
+    """The app's one Redis client (it pools connections), or None without REDIS_URL."""
+    url = current_app.config["REDIS_URL"]
+    if not url:
+        return None
+    client = current_app.extensions.get("redis")
+    if client is None:
+        import redis
+        client = current_app.extensions.setdefault("redis", redis.Redis.from_url(url))
+    return client
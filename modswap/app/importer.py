@@ -0,0 +1,113 @@
+import csv
+import io
+import json
+import time
+from itertools import islice
+from flask import current_app
+from sqlalchemy.dialects import postgresql, sqlite
+from .extensions import db
+from .models import Module
+from . import catalogue
+
+
+FORMATS = ("csv", "jsonl")
+
+
+def guess_format(filename):
+    name = (filename or "").lower()
+    if name.endswith((".jsonl", ".ndjson", ".json")):
+        return "jsonl"
+    return "csv"
+
+
+def read_rows(stream, fmt):
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        try:
+            yield from reader
+        except csv.Error as e:
+            raise ValueError(f"line {reader.line_num}: {e}") from e
+    else:
+        for line in stream:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def field(value):
+    # JSON lines may carry numbers, e.g. {"code": 101}; nested values are unusable.
+    return str(value).strip() if isinstance(value, (str, int, float)) else ""
+
+
+def normalise(row, university=None):
+    if not isinstance(row, dict):
+        return None
+    code = field(row.get("code"))
+    name = field(row.get("name"))
+    uni = field(row.get("university")) or field(university)
+    if not code or not name or not uni:
+        return None
+    year = row.get("year")
+    try:
+        year = int(year) if year not in (None, "") else None
+    except (TypeError, ValueError):
+        year = None
+    return {"code": code, "name": name, "department": field(row.get("department")) or None,
+            "university": uni, "year": year}
+
+
+def upsert_statement():
+    dialect = db.engine.dialect.name
+    if dialect == "postgresql":
+        stmt = postgresql.insert(Module.__table__)
+    elif dialect == "sqlite":
+        stmt = sqlite.insert(Module.__table__)
+    else:
+        raise RuntimeError(f"module import does not support {dialect}")
+    return stmt.on_conflict_do_update(
+        index_elements=["university", "code"],
+        set_={"name": stmt.excluded.name, "department": stmt.excluded.department, "year": stmt.excluded.year},
+    )
+
+
+def import_modules(stream, fmt="csv", university=None, batch_size=1000):
+    """Upsert modules from a text stream of CSV or JSON lines, one batch at a time."""
+    if fmt not in FORMATS:
+        raise ValueError(f"unknown format {fmt!r}")
+    if not isinstance(stream, io.TextIOBase) and hasattr(stream, "read"):
+        stream = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    stmt = upsert_statement()
+    rows = read_rows(stream, fmt)
+    seen = skipped = committed = 0
+    start = time.perf_counter()
+    try:
+        while True:
+            chunk = list(islice(rows, batch_size))
+            if not chunk:
+                break
+            seen += len(chunk)
+            batch = {}
+            for raw in chunk:
+                row = normalise(raw, university)
+                if row is None:
+                    skipped += 1
+                    continue
+                # ON CONFLICT cannot touch the same row twice in one statement.
+                batch[(row["university"], row["code"])] = row
+            if batch:
+                db.session.execute(stmt, list(batch.values()))
+                db.session.commit()
+                committed += 1
+    finally:
+        # Batches already committed stay, even if a later line is malformed.
+        if committed:
+            current_app.extensions.pop("search_vocab", None)
+            catalogue.bump()
+    elapsed = time.perf_counter() - start
+    return {
+        "rows": seen,
+        "imported": seen - skipped,
+        "skipped": skipped,
+        "seconds": elapsed,
+        "rows_per_sec": seen / elapsed if elapsed else 0.0,
+    }
@@ -0,0 +1,193 @@
+import json
+import threading
+import time
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import and_, func, insert, or_, select, update
+from .extensions import db, get_redis, socketio
+from .models import Notification
+from . import instrumentation
+
+
+class UnreadCounts:
+    """Unread notification count per user, adjusted as notifications are
+    written and read rather than counted on every poll.
+
+    A missing entry is counted once from the table; adjustments only touch
+    entries that are already cached so a miss never turns into a wrong count.
+    """
+
+    prefix = "modswap:unread"
+
+    ADD = """
+    if redis.call('EXISTS', KEYS[1]) == 1 then
+        return redis.call('INCRBY', KEYS[1], ARGV[1])
+    end
+    return nil
+    """
+
+    def __init__(self, ttl=3600, redis=None, maxsize=10000):
+        self.ttl = ttl
+        self.redis = redis
+        self.maxsize = maxsize
+        self.data = {}
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._add = redis.register_script(self.ADD) if redis is not None else None
+
+    def get(self, user_id):
+        if self.redis is not None:
+            raw = self.redis.get(f"{self.prefix}:{user_id}")
+            found = int(raw) if raw is not None else None
+        else:
+            with self._lock:
+                cached = self.data.get(user_id)
+            found = cached[1] if cached and cached[0] > time.monotonic() else None
+        if found is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return found
+
+    def set(self, user_id, count):
+        if self.redis is not None:
+            self.redis.set(f"{self.prefix}:{user_id}", count, ex=self.ttl)
+            return
+        with self._lock:
+            self._store(user_id, count)
+
+    def fill(self, user_id, count):
+        """Cache a count read from the table after a miss.
+
+        An entry written in the meantime, already adjusted by ``add``, is
+        newer than the count and is kept.
+        """
+        if self.redis is not None:
+            self.redis.set(f"{self.prefix}:{user_id}", count, ex=self.ttl, nx=True)
+            return
+        with self._lock:
+            cached = self.data.get(user_id)
+            if cached is None or cached[0] <= time.monotonic():
+                self._store(user_id, count)
+
+    def _store(self, user_id, count):
+        self.data.pop(user_id, None)
+        self.data[user_id] = (time.monotonic() + self.ttl, count)
+        while len(self.data) > self.maxsize:
+            self.data.pop(next(iter(self.data)))
+
+    def add(self, user_id, delta):
+        if self.redis is not None:
+            found = self._add(keys=[f"{self.prefix}:{user_id}"], args=[delta])
+            return int(found) if found is not None else None
+        with self._lock:
+            cached = self.data.get(user_id)
+            if cached is None:
+                return None
+            count = max(cached[1] + delta, 0)
+            self.data[user_id] = (cached[0], count)
+            return count
+
+
+def get_counts():
+    counts = current_app.extensions.get("unread_counts")
+    if counts is None:
+        client = get_redis()
+        # A per-process count cannot see other workers' writes, so it is
+        # only trusted for a few seconds.
+        ttl = current_app.config["UNREAD_COUNT_TTL" if client is not None else "UNREAD_COUNT_LOCAL_TTL"]
+        counts = UnreadCounts(ttl, client)
+        counts = current_app.extensions.setdefault("unread_counts", counts)
+        instrumentation.track_cache("unread", counts)
+    return counts
+
+
+def user_room(user_id):
+    return f"user:{user_id}"
+
+
+def serialize(row):
+    return {
+        "id": row.id,
+        "type": row.type,
+        "payload": json.loads(row.payload) if row.payload else None,
+        "read": bool(row.read),
+        "created_at": row.created_at.isoformat(),
+    }
+
+
+def unread_count(user_id):
+    counts = get_counts()
+    count = counts.get(user_id)
+    if count is None:
+        count = db.session.execute(
+            select(func.count()).select_from(Notification)
+            .where(Notification.user_id == user_id, Notification.read.is_(False))
+        ).scalar()
+        counts.fill(user_id, count)
+    return count
+
+
+def notify(rows):
+    """Insert notifications, commit, then bump the unread counts and push
+    each one to its owner's room.
+
+    ``rows`` are dicts with ``user_id``, ``type`` and ``payload`` (text);
+    anything else already in the caller's session is committed with them.
+    """
+    if not rows:
+        return 0
+    now = datetime.utcnow()
+    rows = [{"read": False, "created_at": now, **row} for row in rows]
+    db.session.execute(insert(Notification.__table__), rows)
+    db.session.commit()
+    per_user = {}
+    for row in rows:
+        per_user.setdefault(row["user_id"], []).append(row)
+    counts = get_counts()
+    push = current_app.config["NOTIFICATION_PUSH"]
+    for user_id, items in per_user.items():
+        unread = counts.add(user_id, len(items))
+        if push:
+            socketio.emit("notifications", {
+                "unread": unread,
+                "notifications": [
+                    {"type": r["type"], "payload": json.loads(r["payload"]) if r["payload"] else None,
+                     "created_at": r["created_at"].isoformat()}
+                    for r in items
+                ],
+            }, to=user_room(user_id))
+    return len(rows)
+
+
+def page(user_id, before=None, limit=20, unread_only=False):
+    query = select(Notification).where(Notification.user_id == user_id)
+    if unread_only:
+        query = query.where(Notification.read.is_(False))
+    if before:
+        created, nid = before
+        query = query.where(or_(
+            Notification.created_at < created,
+            and_(Notification.created_at == created, Notification.id < nid),
+        ))
+    return db.session.execute(
+        query.order_by(Notification.created_at.desc(), Notification.id.desc()).limit(limit)
+    ).scalars().all()
+
+
+def mark_read(user_id, ids=None):
+    """Mark the given notifications (or all of them) read in one statement."""
+    stmt = update(Notification).where(Notification.user_id == user_id, Notification.read.is_(False))
+    if ids is not None:
+        if not ids:
+            return 0
+        stmt = stmt.where(Notification.id.in_(ids))
+    updated = db.session.execute(stmt.values(read=True).execution_options(synchronize_session=False)).rowcount
+    db.session.commit()
+    counts = get_counts()
+    if ids is None:
+        counts.set(user_id, 0)
+    elif updated:
+        counts.add(user_id, -updated)
+    return updated
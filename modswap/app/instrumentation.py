@@ -0,0 +1,206 @@
+import bisect
+import logging
+import threading
+import time
+from functools import wraps
+from flask import g, current_app, has_request_context, request, before_render_template, template_rendered
+from sqlalchemy import event
+from .extensions import db
+
+
+log = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class QueryBudgetExceeded(RuntimeError):
+    pass
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        if i < len(self.counts):
+            self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    """Per-process request, SQL and template timings in Prometheus form."""
+
+    def __init__(self):
+        self.latency = {}
+        self.queries = {}
+        self.sql_seconds = {}
+        self.templates = {}
+        self._lock = threading.Lock()
+
+    def observe_request(self, endpoint, method, status, seconds, queries, sql_seconds):
+        key = (endpoint, method, str(status))
+        with self._lock:
+            self.latency.setdefault(key, Histogram(LATENCY_BUCKETS)).observe(seconds)
+            self.queries.setdefault(endpoint, Histogram(QUERY_BUCKETS)).observe(queries)
+            self.sql_seconds[endpoint] = self.sql_seconds.get(endpoint, 0.0) + sql_seconds
+
+    def observe_template(self, name, seconds):
+        with self._lock:
+            self.templates.setdefault(name, Histogram(LATENCY_BUCKETS)).observe(seconds)
+
+    def render(self, caches):
+        out = []
+        with self._lock:
+            _histogram(out, "modswap_request_duration_seconds", "Request latency by endpoint.",
+                       ("endpoint", "method", "status"), self.latency)
+            _histogram(out, "modswap_request_sql_queries", "SQL statements per request by endpoint.",
+                       ("endpoint",), {(k,): v for k, v in self.queries.items()})
+            out.append("# HELP modswap_request_sql_seconds_total Time spent in SQL by endpoint.")
+            out.append("# TYPE modswap_request_sql_seconds_total counter")
+            for endpoint, total in sorted(self.sql_seconds.items()):
+                out.append(f'modswap_request_sql_seconds_total{{endpoint="{_escape(endpoint)}"}} {total:.6f}')
+            _histogram(out, "modswap_template_render_seconds", "Template render time by template.",
+                       ("template",), {(k,): v for k, v in self.templates.items()})
+        for metric, kind, help_text in (
+            ("hits", "counter", "Cache hits."),
+            ("misses", "counter", "Cache misses."),
+            ("hit_rate", "gauge", "Cache hit ratio since start."),
+        ):
+            name = f"modswap_cache_{metric}_total" if kind == "counter" else f"modswap_cache_{metric}"
+            out.append(f"# HELP {name} {help_text}")
+            out.append(f"# TYPE {name} {kind}")
+            for cache, stats in sorted(caches.items()):
+                out.append(f'{name}{{cache="{_escape(cache)}"}} {stats[metric]}')
+        return "\n".join(out) + "\n"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _histogram(out, name, help_text, label_names, series):
+    out.append(f"# HELP {name} {help_text}")
+    out.append(f"# TYPE {name} histogram")
+    for key, hist in sorted(series.items()):
+        labels = ",".join(f'{n}="{_escape(v)}"' for n, v in zip(label_names, key))
+        cumulative = 0
+        for bound, count in zip(hist.buckets, hist.counts):
+            cumulative += count
+            out.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        out.append(f'{name}_bucket{{{labels},le="+Inf"}} {hist.count}')
+        out.append(f"{name}_sum{{{labels}}} {hist.sum:.6f}")
+        out.append(f"{name}_count{{{labels}}} {hist.count}")
+
+
+def query_budget(limit):
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            g.query_budget = limit
+            return view(*args, **kwargs)
+        return wrapped
+    return decorator
+
+
+def query_count():
+    return g.get("query_count", 0)
+
+
+def track_cache(name, cache):
+    # Anything with ``hits`` and ``misses`` counters.
+    current_app.extensions.setdefault("caches", {})[name] = cache
+
+
+def cache_stats():
+    stats = {}
+    for name, cache in current_app.extensions.get("caches", {}).items():
+        total = cache.hits + cache.misses
+        stats[name] = {"hits": cache.hits, "misses": cache.misses, "hit_rate": cache.hits / total if total else 0.0}
+    return stats
+
+
+def add_collector(collect):
+    # ``collect()`` returns extra exposition lines, gathered at scrape time.
+    current_app.extensions.setdefault("metric_collectors", []).append(collect)
+
+
+def render_metrics():
+    out = current_app.extensions["metrics"].render(cache_stats())
+    for collect in current_app.extensions.get("metric_collectors", []):
+        out += "".join(line + "\n" for line in collect())
+    return out
+
+
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        g.query_count = g.get("query_count", 0) + 1
+
+
+def _start_query(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context.query_started = time.perf_counter()
+
+
+def _time_query(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "query_started", None)
+    if started is not None and has_request_context():
+        g.sql_seconds = g.get("sql_seconds", 0.0) + time.perf_counter() - started
+
+
+def _start_request():
+    g.request_started = time.perf_counter()
+
+
+def _start_template(sender, template, context, **extra):
+    if has_request_context():
+        g.setdefault("template_started", []).append(time.perf_counter())
+
+
+def _end_template(sender, template, context, **extra):
+    started = g.get("template_started") if has_request_context() else None
+    if started:
+        sender.extensions["metrics"].observe_template(template.name or "<string>", time.perf_counter() - started.pop())
+
+
+def _record_request(response):
+    started = g.get("request_started")
+    if started is not None:
+        current_app.extensions["metrics"].observe_request(
+            request.endpoint or "<unmatched>", request.method, response.status_code,
+            time.perf_counter() - started, query_count(), g.get("sql_seconds", 0.0),
+        )
+    return response
+
+
+def _check_budget(response):
+    budget = g.get("query_budget")
+    count = query_count()
+    if budget is not None and count > budget:
+        message = f"{request.endpoint} ran {count} queries (budget {budget})"
+        if current_app.config.get("QUERY_BUDGET_STRICT") or current_app.testing:
+            raise QueryBudgetExceeded(message)
+        log.warning(message)
+    return response
+
+
+def init_app(app):
+    with app.app_context():
+        event.listen(db.engine, "before_cursor_execute", _count_query)
+        if app.config["METRICS_ENABLED"]:
+            event.listen(db.engine, "before_cursor_execute", _start_query)
+            event.listen(db.engine, "after_cursor_execute", _time_query)
+    app.after_request(_check_budget)
+    if app.config["METRICS_ENABLED"]:
+        app.extensions["metrics"] = Metrics()
+        app.before_request(_start_request)
+        app.after_request(_record_request)
+        before_render_template.connect(_start_template, app)
+        template_rendered.connect(_end_template, app)
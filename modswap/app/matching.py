@@ -0,0 +1,266 @@
+import heapq
+import threading
+import time
+from collections import Counter
+from datetime import timedelta
+from flask import current_app
+from sqlalchemy import select, or_, func
+from .extensions import db
+from .models import SwapArchive, SwapRequest, swap_give_modules, swap_want_modules
+
+
+CLOSED_STATUSES = ("Approved", "Rejected", "Expired")
+
+# How far behind the newest indexed created_at a catch-up looks again: ids
+# are handed out before commit, so a swap can become visible after one with
+# a higher id, and app servers' clocks drift a little.
+CATCH_UP_OVERLAP = timedelta(minutes=2)
+
+# Filters whose module counts are kept; admins rarely juggle more.
+MODULE_COUNT_CACHE_SIZE = 64
+
+
+def open_clause():
+    return or_(SwapRequest.status.is_(None), SwapRequest.status.not_in(CLOSED_STATUSES))
+
+
+def module_sets(swaps):
+    return {s.id: ({m.id for m in s.giving}, {m.id for m in s.wanting}) for s in swaps}
+
+
+def module_counts(sets):
+    give_counts = Counter()
+    want_counts = Counter()
+    for gives, wants in sets.values():
+        give_counts.update(gives)
+        want_counts.update(wants)
+    return give_counts, want_counts
+
+
+def module_counts_within(swap_ids_query):
+    # Give/want counts per module over every swap selected by
+    # ``swap_ids_query`` rather than just the loaded ones.
+    counts = []
+    for table in (swap_give_modules, swap_want_modules):
+        rows = db.session.execute(
+            select(table.c.module_id, func.count())
+            .where(table.c.swap_id.in_(swap_ids_query))
+            .group_by(table.c.module_id)
+        ).all()
+        counts.append(Counter(dict(rows)))
+    return counts[0], counts[1]
+
+
+def cached_module_counts(key, swap_ids_query, ttl):
+    # Counting a filtered set costs a scan of both link tables; paging
+    # through one filter reuses it for ``ttl`` seconds.
+    cache = current_app.extensions.setdefault("module_count_cache", {})
+    now = time.monotonic()
+    hit = cache.get(key)
+    if hit is not None and hit[0] > now:
+        return hit[1]
+    counts = module_counts_within(swap_ids_query)
+    if len(cache) >= MODULE_COUNT_CACHE_SIZE:
+        cache.clear()
+    cache[key] = (now + ttl, counts)
+    return counts
+
+
+def overlap_scores(sets, give_counts, want_counts):
+    # Row sums of G·Wᵀ + W·Gᵀ for the swap×module incidence matrices G and W,
+    # minus each swap's overlap with itself: the pairwise score summed over
+    # every other swap, in O(non-zeros) instead of O(n²).
+    return {
+        sid: sum(want_counts[m] for m in gives) + sum(give_counts[m] for m in wants) - 2 * len(gives & wants)
+        for sid, (gives, wants) in sets.items()
+    }
+
+
+class IndexedSwap:
+    __slots__ = ("user_id", "gives", "wants", "alerts_email")
+
+    def __init__(self, user_id, gives, wants, alerts_email=False):
+        self.user_id = user_id
+        self.gives = frozenset(gives)
+        self.wants = frozenset(wants)
+        self.alerts_email = bool(alerts_email)
+
+
+class SwapIndex:
+    """Inverted index from module id to the ids of open swaps giving/wanting it."""
+
+    def __init__(self):
+        self.gives = {}
+        self.wants = {}
+        self.entries = {}
+        self.watermark = None
+        self.resolved_watermark = None
+        self.built_at = None
+        self.version = 0
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def build(self):
+        with self._lock:
+            self.gives = {}
+            self.wants = {}
+            self.entries = {}
+            self.watermark = None
+            self.resolved_watermark = db.session.execute(select(func.max(SwapArchive.resolved_at))).scalar()
+            self._load(None)
+            self.built_at = time.monotonic()
+            self.version += 1
+
+    def catch_up(self):
+        with self._lock:
+            # Dropped before loading, so a swap that reused an archived id is
+            # indexed afresh rather than skipped as already known.
+            dropped = self._drop_resolved()
+            since = self.watermark - CATCH_UP_OVERLAP if self.watermark is not None else None
+            if self._load(since) or dropped:
+                self.version += 1
+
+    def refresh(self, ttl):
+        if self.built_at is None or (ttl is not None and time.monotonic() - self.built_at > ttl):
+            self.build()
+        else:
+            self.catch_up()
+
+    def _drop_resolved(self):
+        # Swaps another process archived since the last look; a local archive
+        # discards them straight away.
+        query = select(SwapArchive.id, SwapArchive.resolved_at)
+        if self.resolved_watermark is not None:
+            query = query.where(SwapArchive.resolved_at >= self.resolved_watermark - CATCH_UP_OVERLAP)
+        dropped = 0
+        for sid, resolved_at in db.session.execute(query).all():
+            dropped += self._drop(sid)
+            if resolved_at is not None and (self.resolved_watermark is None or resolved_at > self.resolved_watermark):
+                self.resolved_watermark = resolved_at
+        return dropped
+
+    def _load(self, since):
+        # Open swaps created at or after ``since`` that are not indexed yet.
+        recent = [open_clause()]
+        if since is not None:
+            recent.append(SwapRequest.created_at >= since)
+        rows = [
+            row for row in db.session.execute(
+                select(SwapRequest.id, SwapRequest.user_id, SwapRequest.alerts_email, SwapRequest.created_at)
+                .where(*recent)
+            ).all()
+            if row.id not in self.entries
+        ]
+        if not rows:
+            return 0
+        gives = {row.id: [] for row in rows}
+        wants = {row.id: [] for row in rows}
+        for table, target in ((swap_give_modules, gives), (swap_want_modules, wants)):
+            pairs = db.session.execute(
+                select(table.c.swap_id, table.c.module_id)
+                .join(SwapRequest, SwapRequest.id == table.c.swap_id)
+                .where(*recent)
+            ).all()
+            for sid, mid in pairs:
+                if sid in target:
+                    target[sid].append(mid)
+        for sid, user_id, alerts_email, created_at in rows:
+            self._put(sid, IndexedSwap(user_id, gives[sid], wants[sid], alerts_email))
+            if created_at is not None and (self.watermark is None or created_at > self.watermark):
+                self.watermark = created_at
+        return len(rows)
+
+    def _put(self, swap_id, entry):
+        self._drop(swap_id)
+        self.entries[swap_id] = entry
+        for mid in entry.gives:
+            self.gives.setdefault(mid, set()).add(swap_id)
+        for mid in entry.wants:
+            self.wants.setdefault(mid, set()).add(swap_id)
+
+    def _drop(self, swap_id):
+        entry = self.entries.pop(swap_id, None)
+        if entry is None:
+            return False
+        for postings, mids in ((self.gives, entry.gives), (self.wants, entry.wants)):
+            for mid in mids:
+                ids = postings.get(mid)
+                if ids is not None:
+                    ids.discard(swap_id)
+                    if not ids:
+                        del postings[mid]
+        return True
+
+    def add(self, swap):
+        if swap.status in CLOSED_STATUSES:
+            return self.discard(swap.id)
+        with self._lock:
+            self._put(swap.id, IndexedSwap(
+                swap.user_id, [m.id for m in swap.giving], [m.id for m in swap.wanting], swap.alerts_email
+            ))
+            self.version += 1
+
+    def discard(self, swap_id):
+        return self.discard_many([swap_id])
+
+    def discard_many(self, swap_ids):
+        with self._lock:
+            removed = sum(1 for sid in swap_ids if self._drop(sid))
+            if removed:
+                self.version += 1
+            return removed
+
+    def module_counts(self, module_ids):
+        # Posting-list sizes: give/want counts over every open swap, no query.
+        with self._lock:
+            return (
+                Counter({mid: len(self.gives[mid]) for mid in module_ids if mid in self.gives}),
+                Counter({mid: len(self.wants[mid]) for mid in module_ids if mid in self.wants}),
+            )
+
+    def _scores(self, give_ids, want_ids, exclude_user=None):
+        scores = {}
+        for mid in give_ids:
+            for sid in self.wants.get(mid, ()):
+                scores[sid] = scores.get(sid, 0) + 1
+        for mid in want_ids:
+            for sid in self.gives.get(mid, ()):
+                scores[sid] = scores.get(sid, 0) + 1
+        if exclude_user is not None:
+            scores = {sid: sc for sid, sc in scores.items() if self.entries[sid].user_id != exclude_user}
+        return scores
+
+    def match(self, give_ids, want_ids, exclude_user=None, k=20):
+        with self._lock:
+            scores = self._scores(give_ids, want_ids, exclude_user)
+        return heapq.nlargest(k, scores.items(), key=lambda kv: (kv[1], -kv[0]))
+
+    def matches_for(self, swap_id, k=50, min_score=None):
+        """Open swaps of other users that an indexed swap matches.
+
+        Found from its own modules' posting lists only. With ``min_score``,
+        a match must be mutual -- each side gives something the other wants
+        -- or overlap on at least ``min_score`` modules.
+        """
+        with self._lock:
+            entry = self.entries.get(swap_id)
+            if entry is None:
+                return []
+            scores = self._scores(entry.gives, entry.wants, exclude_user=entry.user_id)
+            if min_score is not None:
+                scores = {
+                    sid: sc for sid, sc in scores.items()
+                    if sc >= min_score or (self.entries[sid].gives & entry.wants and self.entries[sid].wants & entry.gives)
+                }
+            top = heapq.nlargest(k, scores.items(), key=lambda kv: (kv[1], -kv[0]))
+            return [(sid, score, self.entries[sid]) for sid, score in top]
+
+
+def get_swap_index():
+    index = current_app.extensions.get("swap_index")
+    if index is None:
+        index = current_app.extensions.setdefault("swap_index", SwapIndex())
+    index.refresh(current_app.config.get("SWAP_INDEX_TTL"))
+    return index
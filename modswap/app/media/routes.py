@@ -0,0 +1,32 @@
+from flask import Blueprint, abort, current_app, send_from_directory, session
+from flask_login import current_user
+from sqlalchemy import select
+from ..extensions import db
+from ..models import Document
+from ..storage import get_storage
+
+media_bp = Blueprint("media", __name__)
+
+
+@media_bp.get("/<path:key>")
+def serve(key: str):
+    prefix = key.split("/", 1)[0]
+    if prefix not in {"avatars", "thumbs", "docs"}:
+        abort(404)
+    private = prefix == "docs"
+    if private:
+        if not current_user.is_authenticated:
+            abort(404)
+        if session.get("role") != "teacher" and not db.session.execute(
+            select(Document.id).where(Document.path == key, Document.user_id == current_user.id)
+        ).first():
+            abort(404)
+    # Keys are content hashes, so a cached copy can never go stale.
+    response = send_from_directory(get_storage().root, key, max_age=current_app.config["MEDIA_MAX_AGE"])
+    response.cache_control.immutable = True
+    if private:
+        response.cache_control.private = True
+        response.cache_control.public = False
+    else:
+        response.cache_control.public = True
+    return response
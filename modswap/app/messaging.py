@@ -0,0 +1,94 @@
+import atexit
+import threading
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import and_, insert, or_, select
+from .extensions import db, socketio
+from .models import Message
+
+
+class MessageWriter:
+    """Buffers chat messages and persists them in batched INSERTs."""
+
+    def __init__(self, app, batch_size=100, interval=0.5):
+        self.app = app
+        self.batch_size = batch_size
+        self.interval = interval
+        self.buffer = []
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.wake = threading.Event()
+        self.started = False
+        self.written = 0
+        self.batches = 0
+
+    def submit(self, swap_id, sender_id, receiver_id, content):
+        row = {
+            "swap_id": swap_id,
+            "sender_id": sender_id,
+            "receiver_id": receiver_id,
+            "content": content,
+            "created_at": datetime.utcnow(),
+        }
+        with self.lock:
+            self.buffer.append(row)
+            if not self.started:
+                self.started = True
+                socketio.start_background_task(self._run)
+        if len(self.buffer) >= self.batch_size:
+            # Hand the write to the flusher rather than doing it here: the
+            # event handler already holds a pooled connection.
+            self.wake.set()
+        return row
+
+    def flush(self):
+        with self.flush_lock:
+            with self.lock:
+                rows, self.buffer = self.buffer, []
+            if not rows:
+                return 0
+            with self.app.app_context():
+                db.session.execute(insert(Message), rows)
+                db.session.commit()
+            self.written += len(rows)
+            self.batches += 1
+            return len(rows)
+
+    def _run(self):
+        while True:
+            self.wake.wait(self.interval)
+            self.wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                self.app.logger.exception("failed to persist chat messages")
+
+
+def get_writer():
+    writer = current_app.extensions.get("message_writer")
+    if writer is None:
+        app = current_app._get_current_object()
+        writer = MessageWriter(app, current_app.config["CHAT_BATCH_SIZE"], current_app.config["CHAT_FLUSH_INTERVAL"])
+        writer = current_app.extensions.setdefault("message_writer", writer)
+        atexit.register(writer.flush)
+    return writer
+
+
+def conversation_room(swap_id, counterpart_id):
+    return f"swap:{swap_id}:{counterpart_id}"
+
+
+def history(swap_id, user_a, user_b, before=None, limit=50):
+    query = select(Message).where(
+        Message.swap_id == swap_id,
+        or_(
+            and_(Message.sender_id == user_a, Message.receiver_id == user_b),
+            and_(Message.sender_id == user_b, Message.receiver_id == user_a),
+        ),
+    )
+    if before:
+        created, mid = before
+        query = query.where(or_(Message.created_at < created, and_(Message.created_at == created, Message.id < mid)))
+    return db.session.execute(
+        query.order_by(Message.created_at.desc(), Message.id.desc()).limit(limit)
+    ).scalars().all()
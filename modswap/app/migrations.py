@@ -0,0 +1,316 @@
+import json
+import logging
+from collections import Counter
+from datetime import datetime
+from sqlalchemy import (
+    Column, DateTime, Integer, MetaData, String, Table, and_, bindparam, func, inspect, select, text,
+)
+from sqlalchemy.exc import OperationalError, ProgrammingError
+from sqlalchemy.schema import CreateTable
+from .extensions import db
+from .matching import CLOSED_STATUSES
+from .models import (
+    DispatchJob, Message, Notification, Rating, SwapArchive, SwapRequest, module_signature, swap_give_modules, swap_want_modules,
+)
+from . import moderation, search, seed, stats
+
+
+log = logging.getLogger(__name__)
+
+version_metadata = MetaData()
+
+schema_migrations = Table(
+    "schema_migrations",
+    version_metadata,
+    Column("version", Integer, primary_key=True),
+    Column("name", String(255), nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+BASELINE_TABLES = (
+    "users", "modules", "user_modules", "user_wishlist", "swap_requests", "swap_give_modules",
+    "swap_want_modules", "messages", "notifications", "documents", "ratings",
+)
+
+# Columns added to deployments that predate them, in the order the old
+# startup probe added them.
+LEGACY_COLUMNS = {
+    "users": [
+        ("username", "VARCHAR(255)"),
+        ("role", "VARCHAR(50)"),
+        ("password_hash", "VARCHAR(255)"),
+        ("profile_image", "VARCHAR(255)"),
+        ("department", "VARCHAR(255)"),
+        ("bio", "TEXT"),
+        ("interests", "TEXT"),
+        ("email_notifications", "BOOLEAN DEFAULT FALSE"),
+        ("verified_ac_email", "BOOLEAN DEFAULT FALSE"),
+        ("student_id_status", "VARCHAR(50) DEFAULT 'None'"),
+        ("preferred_timeslots", "VARCHAR(255)"),
+        ("campus", "VARCHAR(255)"),
+        ("preferred_module_groups", "TEXT"),
+        ("show_university", "BOOLEAN DEFAULT TRUE"),
+        ("show_modules", "BOOLEAN DEFAULT TRUE"),
+        ("show_bio", "BOOLEAN DEFAULT TRUE"),
+        ("consent_data_usage", "BOOLEAN DEFAULT FALSE"),
+    ],
+    "swap_requests": [
+        ("notes", "TEXT"),
+        ("priority", "VARCHAR(20)"),
+        ("expires_at", "TIMESTAMP"),
+        ("timeslots", "VARCHAR(255)"),
+        ("campus", "VARCHAR(255)"),
+        ("module_group_pref", "TEXT"),
+        ("visibility", "VARCHAR(20) DEFAULT 'public'"),
+        ("alerts_email", "BOOLEAN DEFAULT FALSE"),
+        ("auto_create_chat", "BOOLEAN DEFAULT FALSE"),
+    ],
+}
+
+
+def add_missing_columns(conn, table, columns):
+    existing = {c["name"] for c in inspect(conn).get_columns(table)}
+    for name, ddl in columns:
+        if name not in existing:
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}"))
+
+
+def create_indexes(conn, *tables):
+    for name in tables:
+        existing = {c["name"] for c in inspect(conn).get_columns(name)}
+        for index in db.metadata.tables[name].indexes:
+            # Indexes on columns a later migration adds are left to it.
+            if all(c.name in existing for c in index.columns):
+                index.create(bind=conn, checkfirst=True)
+
+
+def m001_baseline(conn):
+    db.metadata.create_all(bind=conn, tables=[db.metadata.tables[t] for t in BASELINE_TABLES])
+    for table, columns in LEGACY_COLUMNS.items():
+        add_missing_columns(conn, table, columns)
+
+
+def m002_listing_indexes(conn):
+    create_indexes(conn, "modules", "swap_requests", "swap_give_modules", "swap_want_modules")
+
+
+def m003_search(conn):
+    search.install(conn)
+
+
+def m004_module_catalogue_key(conn):
+    create_indexes(conn, "modules")
+
+
+def m005_chat_history_index(conn):
+    create_indexes(conn, "messages")
+
+
+def m006_email_dispatch(conn):
+    db.metadata.create_all(bind=conn, tables=[db.metadata.tables["dispatch_jobs"]])
+    add_missing_columns(conn, "notifications", [("emailed_at", "TIMESTAMP")])
+    create_indexes(conn, "notifications")
+
+
+def m007_swap_archive(conn):
+    db.metadata.create_all(bind=conn, tables=[db.metadata.tables[t] for t in ("swap_archive", "user_swap_stats")])
+    if conn.dialect.name == "postgresql":
+        # Chat and ratings outlive the live swap row.
+        conn.execute(text("ALTER TABLE messages DROP CONSTRAINT IF EXISTS messages_swap_id_fkey"))
+        conn.execute(text("ALTER TABLE ratings DROP CONSTRAINT IF EXISTS ratings_swap_id_fkey"))
+    ids = conn.execute(select(SwapRequest.id).where(SwapRequest.status.in_(CLOSED_STATUSES))).scalars().all()
+    for chunk in moderation.chunked(ids, 1000):
+        moderation.archive_chunk(conn, chunk)
+
+
+def m008_user_stats(conn):
+    add_missing_columns(conn, "user_swap_stats", [("matches", "INTEGER DEFAULT 0")])
+    create_indexes(conn, "swap_requests")
+    # A match counts for the owner alerted and for whoever posted the new swap.
+    counts = Counter()
+    posted = Counter()
+    for user_id, payload in conn.execute(
+        select(Notification.user_id, Notification.payload).where(Notification.type == "match")
+    ):
+        counts[user_id] += 1
+        swap_id = json.loads(payload or "{}").get("swap_id")
+        if swap_id:
+            posted[swap_id] += 1
+    for table in (SwapRequest.__table__, SwapArchive.__table__):
+        for chunk in moderation.chunked(posted, 1000):
+            for swap_id, user_id in conn.execute(select(table.c.id, table.c.user_id).where(table.c.id.in_(chunk))):
+                counts[user_id] += posted[swap_id]
+    stats.add(conn, {uid: {"matches": n} for uid, n in counts.items()})
+
+
+def m009_module_signature(conn):
+    add_missing_columns(conn, "swap_requests", [("module_signature", "VARCHAR(40)")])
+    swaps = SwapRequest.__table__
+    seen = set()
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            select(swaps.c.id, swaps.c.user_id, swaps.c.status).where(swaps.c.id > last_id).order_by(swaps.c.id).limit(1000)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        ids = [row.id for row in rows]
+        sides = {}
+        for side, table in ((0, swap_give_modules), (1, swap_want_modules)):
+            for swap_id, module_id in conn.execute(
+                select(table.c.swap_id, table.c.module_id).where(table.c.swap_id.in_(ids))
+            ):
+                sides.setdefault(swap_id, ([], []))[side].append(module_id)
+        updates = []
+        for row in rows:
+            signature = module_signature(*sides.get(row.id, ([], [])))
+            if row.status == "Open":
+                # Existing duplicates keep their rows but only the oldest is
+                # signed, so the unique index can be built.
+                if (row.user_id, signature) in seen:
+                    continue
+                seen.add((row.user_id, signature))
+            updates.append({"swap_id": row.id, "signature": signature})
+        if updates:
+            conn.execute(
+                swaps.update().where(swaps.c.id == bindparam("swap_id")).values(module_signature=bindparam("signature")),
+                updates,
+            )
+    create_indexes(conn, "swap_requests")
+
+
+def m010_notification_inbox(conn):
+    create_indexes(conn, "notifications")
+
+
+def m011_document_review_queue(conn):
+    add_missing_columns(conn, "documents", [
+        ("claimed_by", "INTEGER REFERENCES users(id)"),
+        ("claimed_until", "TIMESTAMP"),
+        ("reviewed_by", "INTEGER REFERENCES users(id)"),
+        ("reviewed_at", "TIMESTAMP"),
+    ])
+    create_indexes(conn, "documents")
+
+
+def m012_swap_ids_never_reused(conn):
+    # SQLite hands the highest rowid out again once that row is deleted, so a
+    # new swap could take an archived swap's id along with its chat and
+    # ratings. Postgres sequences never go back.
+    if conn.dialect.name != "sqlite":
+        return
+    swaps = SwapRequest.__table__
+    archived_max = conn.execute(select(func.max(SwapArchive.id))).scalar() or 0
+    next_id = max(conn.execute(select(func.max(swaps.c.id))).scalar() or 0, archived_max) + 1
+    clashes = conn.execute(
+        select(swaps.c.id, swaps.c.created_at).where(swaps.c.id.in_(select(SwapArchive.id))).order_by(swaps.c.id)
+    ).all()
+    for old_id, created_at in clashes:
+        conn.execute(swaps.update().where(swaps.c.id == old_id).values(id=next_id))
+        for table in (swap_give_modules, swap_want_modules):
+            conn.execute(table.update().where(table.c.swap_id == old_id).values(swap_id=next_id))
+        # What was written since the new swap was posted belongs to it.
+        for table in (Message.__table__, Rating.__table__):
+            conn.execute(
+                table.update().where(table.c.swap_id == old_id, table.c.created_at >= created_at).values(swap_id=next_id)
+            )
+        next_id += 1
+    ddl = conn.execute(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'swap_requests'")).scalar()
+    rebuild = "AUTOINCREMENT" not in ddl.upper()
+    if rebuild:
+        scratch = MetaData()
+        db.metadata.tables["users"].to_metadata(scratch)
+        rebuilt = swaps.to_metadata(scratch, name="swap_requests_rebuilt")
+        conn.execute(CreateTable(rebuilt))
+        columns = ", ".join(c.name for c in swaps.columns)
+        conn.execute(text(f"INSERT INTO swap_requests_rebuilt ({columns}) SELECT {columns} FROM swap_requests"))
+        conn.execute(text("DROP TABLE swap_requests"))
+        conn.execute(text("ALTER TABLE swap_requests_rebuilt RENAME TO swap_requests"))
+        create_indexes(conn, "swap_requests")
+        search.install(conn)
+    if clashes or rebuild:
+        if conn.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'swap_notes_fts'")).first():
+            conn.execute(text("INSERT INTO swap_notes_fts(swap_notes_fts) VALUES ('rebuild')"))
+    conn.execute(text("DELETE FROM sqlite_sequence WHERE name = 'swap_requests'"))
+    conn.execute(text("INSERT INTO sqlite_sequence (name, seq) VALUES ('swap_requests', :seq)"), {"seq": next_id - 1})
+
+
+def m013_one_waiting_digest_per_user(conn):
+    jobs = DispatchJob.__table__
+    waiting = and_(jobs.c.locked_until.is_(None), jobs.c.due_at.is_not(None))
+    # Keep the earliest waiting job per user; each digest sends everything unsent.
+    keep = select(func.min(jobs.c.id)).where(waiting).group_by(jobs.c.user_id)
+    conn.execute(jobs.delete().where(waiting, jobs.c.id.not_in(keep)))
+    create_indexes(conn, "dispatch_jobs")
+
+
+def m014_swap_archive_resolved_index(conn):
+    create_indexes(conn, "swap_archive")
+
+
+MIGRATIONS = [
+    (1, "baseline schema", m001_baseline),
+    (2, "listing and lookup indexes", m002_listing_indexes),
+    (3, "full-text search", m003_search),
+    (4, "unique module key per university", m004_module_catalogue_key),
+    (5, "chat history index", m005_chat_history_index),
+    (6, "email dispatch queue", m006_email_dispatch),
+    (7, "swap archive and user stats", m007_swap_archive),
+    (8, "user stats counters", m008_user_stats),
+    (9, "open swap module signature", m009_module_signature),
+    (10, "notification inbox index", m010_notification_inbox),
+    (11, "document review queue", m011_document_review_queue),
+    (12, "never reuse swap ids", m012_swap_ids_never_reused),
+    (13, "one waiting digest per user", m013_one_waiting_digest_per_user),
+    (14, "swap archive resolved_at index", m014_swap_archive_resolved_index),
+]
+
+LATEST = MIGRATIONS[-1][0]
+
+
+def current_version(engine):
+    try:
+        with engine.connect() as conn:
+            return conn.execute(select(db.func.max(schema_migrations.c.version))).scalar() or 0
+    except (OperationalError, ProgrammingError):
+        return 0
+
+
+def migrate(engine):
+    version_metadata.create_all(bind=engine)
+    applied = []
+    with engine.connect() as lock_conn:
+        if engine.dialect.name == "postgresql":
+            lock_conn.execute(text("SELECT pg_advisory_lock(7314)"))
+        try:
+            done = set(lock_conn.execute(select(schema_migrations.c.version)).scalars())
+            lock_conn.rollback()
+            for version, name, step in MIGRATIONS:
+                if version in done:
+                    continue
+                with engine.begin() as conn:
+                    step(conn)
+                    conn.execute(schema_migrations.insert().values(version=version, name=name, applied_at=datetime.utcnow()))
+                log.info("applied migration %03d %s", version, name)
+                applied.append((version, name))
+        finally:
+            if engine.dialect.name == "postgresql":
+                lock_conn.execute(text("SELECT pg_advisory_unlock(7314)"))
+                lock_conn.commit()
+    return applied
+
+
+def check(app):
+    version = current_version(db.engine)
+    if version >= LATEST:
+        return
+    if not app.config["AUTO_MIGRATE"]:
+        log.warning("database schema is at version %s, latest is %s; run `flask modswap migrate`", version, LATEST)
+        return
+    migrate(db.engine)
+    if version == 0 and app.config["SEED_ON_MIGRATE"]:
+        # A database that had never been migrated gets the demo fixtures once;
+        # later boots skip straight past the version check.
+        seed.run()
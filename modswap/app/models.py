@@ -1,8 +1,9 @@
+import hashlib
 from datetime import datetime
 from typing import Optional
 from flask_login import UserMixin
-from sqlalchemy import Table, Column, Integer, String, DateTime, ForeignKey, Boolean, Text
-from sqlalchemy.orm import relationship, Mapped, mapped_column
+from sqlalchemy import Table, Column, Index, Integer, String, DateTime, ForeignKey, Boolean, Text, text
+from sqlalchemy.orm import relationship, Mapped, mapped_column, selectinload, joinedload
 from .extensions import db
 
 
@@ -26,6 +27,7 @@ swap_give_modules = Table(
     db.metadata,
     Column("swap_id", ForeignKey("swap_requests.id"), primary_key=True),
     Column("module_id", ForeignKey("modules.id"), primary_key=True),
+    Index("ix_swap_give_modules_module_id", "module_id"),
 )
 
 
@@ -34,6 +36,7 @@ swap_want_modules = Table(
     db.metadata,
     Column("swap_id", ForeignKey("swap_requests.id"), primary_key=True),
     Column("module_id", ForeignKey("modules.id"), primary_key=True),
+    Index("ix_swap_want_modules_module_id", "module_id"),
 )
 
 
@@ -68,6 +71,10 @@ class User(db.Model, UserMixin):
 
 class Module(db.Model):
     __tablename__ = "modules"
+    __table_args__ = (
+        Index("ix_modules_department_year", "department", "year"),
+        Index("uq_modules_university_code", "university", "code", unique=True),
+    )
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     code: Mapped[str] = mapped_column(String(50), index=True, nullable=False)
     name: Mapped[str] = mapped_column(String(255), nullable=False)
@@ -79,6 +86,18 @@ class Module(db.Model):
 
 class SwapRequest(db.Model):
     __tablename__ = "swap_requests"
+    __table_args__ = (
+        Index("ix_swap_requests_status_priority_created_at", "status", "priority", "created_at"),
+        Index("ix_swap_requests_created_at_id", "created_at", "id"),
+        Index("ix_swap_requests_expires_at", "expires_at"),
+        Index("ix_swap_requests_user_id_created_at", "user_id", "created_at"),
+        Index(
+            "uq_swap_requests_user_id_open_signature", "user_id", "module_signature", unique=True,
+            sqlite_where=text("status = 'Open'"), postgresql_where=text("status = 'Open'"),
+        ),
+        # Archived swaps keep their id; SQLite must never hand it out again.
+        {"sqlite_autoincrement": True},
+    )
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False)
     status: Mapped[str] = mapped_column(String(50), default="Open")
@@ -91,6 +110,7 @@ class SwapRequest(db.Model):
     visibility: Mapped[str] = mapped_column(String(20), default="public")
     alerts_email: Mapped[bool] = mapped_column(Boolean, default=False)
     auto_create_chat: Mapped[bool] = mapped_column(Boolean, default=False)
+    module_signature: Mapped[Optional[str]] = mapped_column(String(40), nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     user = relationship("User")
@@ -98,10 +118,66 @@ class SwapRequest(db.Model):
     wanting = relationship("Module", secondary=swap_want_modules)
 
 
+class SwapArchive(db.Model):
+    # Resolved swaps moved out of swap_requests; module ids are JSON lists so
+    # the link tables only ever hold live rows.
+    __tablename__ = "swap_archive"
+    __table_args__ = (
+        Index("ix_swap_archive_user_id_resolved_at", "user_id", "resolved_at"),
+        Index("ix_swap_archive_resolved_at", "resolved_at"),
+    )
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False)
+    status: Mapped[str] = mapped_column(String(50), nullable=False)
+    notes: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    priority: Mapped[Optional[str]] = mapped_column(String(20), nullable=True)
+    campus: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
+    give_module_ids: Mapped[str] = mapped_column(Text, default="[]")
+    want_module_ids: Mapped[str] = mapped_column(Text, default="[]")
+    created_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    expires_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    resolved_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
+class UserSwapStats(db.Model):
+    __tablename__ = "user_swap_stats"
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), primary_key=True, autoincrement=False)
+    approved: Mapped[int] = mapped_column(Integer, default=0)
+    rejected: Mapped[int] = mapped_column(Integer, default=0)
+    expired: Mapped[int] = mapped_column(Integer, default=0)
+    matches: Mapped[int] = mapped_column(Integer, default=0)
+
+
+def module_signature(give_ids, want_ids):
+    # Order-independent digest of a swap's give/want sets; one user can hold
+    # only one open swap per signature.
+    key = ",".join(map(str, sorted(set(give_ids)))) + "|" + ",".join(map(str, sorted(set(want_ids))))
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def has_open_duplicate(user_id, signature):
+    return db.session.execute(
+        db.select(SwapRequest.id).filter_by(user_id=user_id, status="Open", module_signature=signature)
+    ).first() is not None
+
+
+def swap_loader_options(modules=True, user=False):
+    # List views load giving/wanting for the whole page in one IN query each
+    # instead of two lazy loads per row; the owner is joined when shown.
+    options = []
+    if modules:
+        options += [selectinload(SwapRequest.giving), selectinload(SwapRequest.wanting)]
+    if user:
+        options.append(joinedload(SwapRequest.user))
+    return options
+
+
 class Message(db.Model):
     __tablename__ = "messages"
+    __table_args__ = (Index("ix_messages_swap_id_created_at", "swap_id", "created_at"),)
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    swap_id: Mapped[int] = mapped_column(ForeignKey("swap_requests.id"), nullable=False)
+    # No foreign key: the swap may since have moved to swap_archive.
+    swap_id: Mapped[int] = mapped_column(Integer, nullable=False)
     sender_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False)
     receiver_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False)
     content: Mapped[str] = mapped_column(Text, nullable=False)
@@ -110,28 +186,61 @@ class Message(db.Model):
 
 class Notification(db.Model):
     __tablename__ = "notifications"
+    __table_args__ = (
+        Index("ix_notifications_user_id_emailed_at", "user_id", "emailed_at"),
+        Index("ix_notifications_user_id_read_created_at", "user_id", "read", "created_at"),
+    )
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False)
     type: Mapped[str] = mapped_column(String(50), nullable=False)
     payload: Mapped[str] = mapped_column(Text, nullable=True)
     read: Mapped[bool] = mapped_column(Boolean, default=False)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    emailed_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+
+
+class DispatchJob(db.Model):
+    __tablename__ = "dispatch_jobs"
+    __table_args__ = (
+        Index("ix_dispatch_jobs_due_at", "due_at"),
+        # At most one waiting (unclaimed, not failed) job per user.
+        Index(
+            "uq_dispatch_jobs_user_id_waiting", "user_id", unique=True,
+            sqlite_where=text("locked_until IS NULL AND due_at IS NOT NULL"),
+            postgresql_where=text("locked_until IS NULL AND due_at IS NOT NULL"),
+        ),
+    )
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False)
+    due_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    locked_until: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    last_error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
 
 class Document(db.Model):
     __tablename__ = "documents"
+    __table_args__ = (
+        Index("ix_documents_status_created_at", "status", "created_at"),
+        Index("ix_documents_reviewed_at", "reviewed_at"),
+    )
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False)
     type: Mapped[str] = mapped_column(String(50), nullable=False)
     path: Mapped[str] = mapped_column(String(255), nullable=False)
     status: Mapped[str] = mapped_column(String(50), default="Pending")
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    claimed_by: Mapped[Optional[int]] = mapped_column(ForeignKey("users.id"), nullable=True)
+    claimed_until: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    reviewed_by: Mapped[Optional[int]] = mapped_column(ForeignKey("users.id"), nullable=True)
+    reviewed_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
 
 
 class Rating(db.Model):
     __tablename__ = "ratings"
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    swap_id: Mapped[int] = mapped_column(ForeignKey("swap_requests.id"), nullable=False)
+    swap_id: Mapped[int] = mapped_column(Integer, nullable=False)
     rater_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False)
     receiver_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False)
     thumbs_up: Mapped[bool] = mapped_column(Boolean, default=True)
@@ -0,0 +1,138 @@
+import json
+import threading
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import delete, insert, select, update
+from .extensions import db, socketio
+from .matching import open_clause
+from .models import SwapArchive, SwapRequest, swap_give_modules, swap_want_modules
+from . import stats
+
+
+STAT_COLUMNS = {"Approved": "approved", "Rejected": "rejected", "Expired": "expired"}
+
+
+def chunked(ids, size):
+    ids = sorted(set(ids))
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+
+def archive_chunk(conn, ids, status=None):
+    """Move one chunk of swaps into swap_archive and add them to the owners' stats.
+
+    ``status`` overrides the status each swap is archived under. Runs on a
+    session or a connection and leaves committing to the caller.
+    """
+    links = {}
+    for key, table in (("give_module_ids", swap_give_modules), ("want_module_ids", swap_want_modules)):
+        for swap_id, module_id in conn.execute(
+            select(table.c.swap_id, table.c.module_id).where(table.c.swap_id.in_(ids)).order_by(table.c.module_id)
+        ):
+            links.setdefault(swap_id, {}).setdefault(key, []).append(module_id)
+        conn.execute(delete(table).where(table.c.swap_id.in_(ids)))
+    # Deleting with RETURNING claims the rows, so two moderators resolving
+    # the same swap archive it once.
+    rows = conn.execute(
+        delete(SwapRequest.__table__).where(SwapRequest.id.in_(ids)).returning(
+            SwapRequest.id, SwapRequest.user_id, SwapRequest.status, SwapRequest.notes, SwapRequest.priority,
+            SwapRequest.campus, SwapRequest.created_at, SwapRequest.expires_at,
+        )
+    ).all()
+    if not rows:
+        return 0
+    now = datetime.utcnow()
+    archived = []
+    counters = {}
+    for row in rows:
+        entry = dict(row._mapping, status=status or row.status or "Open", resolved_at=now)
+        modules = links.get(row.id, {})
+        entry["give_module_ids"] = json.dumps(modules.get("give_module_ids", []))
+        entry["want_module_ids"] = json.dumps(modules.get("want_module_ids", []))
+        archived.append(entry)
+        if entry["status"] in STAT_COLUMNS:
+            counts = counters.setdefault(row.user_id, {})
+            column = STAT_COLUMNS[entry["status"]]
+            counts[column] = counts.get(column, 0) + 1
+    conn.execute(insert(SwapArchive), archived)
+    stats.add(conn, counters)
+    return len(rows)
+
+
+def archive_swaps(ids, status=None, chunk_size=500):
+    archived = 0
+    for chunk in chunked(ids, chunk_size):
+        archived += archive_chunk(db.session, chunk, status)
+        db.session.commit()
+    return archived
+
+
+def set_status(ids, status, chunk_size=500):
+    updated = 0
+    for chunk in chunked(ids, chunk_size):
+        result = db.session.execute(
+            update(SwapRequest).where(SwapRequest.id.in_(chunk)).values(status=status)
+            .execution_options(synchronize_session=False)
+        )
+        updated += result.rowcount
+        db.session.commit()
+    return updated
+
+
+def expire_due(now=None, batch_size=500):
+    """Archive open swaps whose ``expires_at`` has passed as Expired; returns their ids."""
+    now = now or datetime.utcnow()
+    expired = []
+    while True:
+        ids = list(db.session.execute(
+            select(SwapRequest.id)
+            .where(SwapRequest.expires_at <= now, open_clause())
+            .order_by(SwapRequest.expires_at)
+            .limit(batch_size)
+        ).scalars())
+        if ids:
+            archive_swaps(ids, "Expired", batch_size)
+            expired += ids
+        if len(ids) < batch_size:
+            return expired
+
+
+def sweep_expired():
+    ids = expire_due(batch_size=current_app.config["EXPIRY_BATCH_SIZE"])
+    # Only a process that already holds the index needs to drop them; others
+    # skip them when they next build it.
+    index = current_app.extensions.get("swap_index")
+    if ids and index is not None:
+        index.discard_many(ids)
+    return ids
+
+
+class ExpirySweeper:
+    def __init__(self, app, interval):
+        self.app = app
+        self.interval = interval
+        self.started = False
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if not self.started:
+                self.started = True
+                socketio.start_background_task(self._run)
+
+    def _run(self):
+        while True:
+            try:
+                with self.app.app_context():
+                    sweep_expired()
+            except Exception:
+                self.app.logger.exception("expiry sweep failed")
+            socketio.sleep(self.interval)
+
+
+def init_app(app):
+    interval = app.config["EXPIRY_SWEEP_INTERVAL"]
+    if interval > 0:
+        sweeper = app.extensions["expiry_sweeper"] = ExpirySweeper(app, interval)
+        # Started by the first request so CLI commands never spawn it.
+        app.before_request(sweeper.start)
@@ -0,0 +1,44 @@
+from flask import Blueprint, request, jsonify
+from flask_login import login_required, current_user
+from .. import inbox
+from ..instrumentation import query_budget
+from ..pagination import next_cursor, page_limit, parse_cursor
+
+notifications_bp = Blueprint("notifications", __name__)
+
+
+@notifications_bp.get("/")
+@login_required
+@query_budget(3)
+def index():
+    limit = page_limit(request.args.get("limit", type=int), 20, 100)
+    rows = inbox.page(
+        current_user.id, parse_cursor(request.args.get("before")), limit,
+        unread_only=request.args.get("unread") in {"1", "true"},
+    )
+    return jsonify({
+        "notifications": [inbox.serialize(n) for n in rows],
+        "next": next_cursor(rows, limit),
+        "unread": inbox.unread_count(current_user.id),
+    })
+
+
+@notifications_bp.get("/unread")
+@login_required
+@query_budget(2)
+def unread():
+    return jsonify({"unread": inbox.unread_count(current_user.id)})
+
+
+@notifications_bp.post("/read")
+@login_required
+def mark_read():
+    data = request.get_json(silent=True) or {}
+    ids = data.get("ids", request.form.getlist("ids"))
+    everything = data.get("all") or request.form.get("all") in {"1", "true"}
+    try:
+        ids = None if everything else [int(x) for x in ids]
+    except (TypeError, ValueError):
+        return jsonify({"error": "ids must be integers"}), 400
+    updated = inbox.mark_read(current_user.id, ids)
+    return jsonify({"updated": updated, "unread": inbox.unread_count(current_user.id)})
@@ -0,0 +1,24 @@
+from datetime import datetime
+
+
+def make_cursor(row):
+    # Keyset position of a row in a (created_at, id) ordering.
+    return f"{row.created_at.isoformat()}_{row.id}"
+
+
+def parse_cursor(value):
+    try:
+        created, row_id = value.rsplit("_", 1)
+        return datetime.fromisoformat(created), int(row_id)
+    except (AttributeError, ValueError):
+        return None
+
+
+def page_limit(value, default, maximum):
+    # A ?limit= of zero, a negative or a non-number falls back to sane bounds.
+    return max(1, min(value if value is not None else default, maximum))
+
+
+def next_cursor(rows, limit):
+    # A full page may have more behind it; a short or empty one is the end.
+    return make_cursor(rows[-1]) if rows and len(rows) == limit else None
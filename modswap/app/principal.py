@@ -0,0 +1,117 @@
+import json
+import threading
+import time
+from flask import current_app
+from sqlalchemy import select
+from .extensions import db, get_redis
+from .models import User
+from . import instrumentation
+
+
+FIELDS = ("id", "email", "role", "university", "verified_ac_email", "student_id_status")
+
+
+class Principal:
+    """The logged-in user as Flask-Login sees it, without loading the row.
+
+    Anything outside ``FIELDS`` falls through to the full ``User``, loaded
+    once per request on first use.
+    """
+
+    __slots__ = FIELDS + ("_user",)
+    is_authenticated = True
+    is_active = True
+    is_anonymous = False
+
+    def __init__(self, **fields):
+        for name in FIELDS:
+            setattr(self, name, fields.get(name))
+        self._user = None
+
+    def get_id(self):
+        return str(self.id)
+
+    @property
+    def user(self):
+        if self._user is None:
+            self._user = db.session.get(User, self.id)
+        return self._user
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return getattr(self.user, name)
+
+
+class PrincipalCache:
+    prefix = "modswap:principal"
+
+    def __init__(self, ttl=60, redis=None, maxsize=10000):
+        self.ttl = ttl
+        self.redis = redis
+        self.maxsize = maxsize
+        self.data = {}
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        if self.redis is not None:
+            raw = self.redis.get(f"{self.prefix}:{user_id}")
+            found = json.loads(raw) if raw is not None else None
+        else:
+            with self._lock:
+                cached = self.data.get(user_id)
+            found = cached[1] if cached and cached[0] > time.monotonic() else None
+        if found is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return found
+
+    def set(self, user_id, fields):
+        if self.redis is not None:
+            self.redis.set(f"{self.prefix}:{user_id}", json.dumps(fields), ex=self.ttl)
+            return
+        with self._lock:
+            self.data.pop(user_id, None)
+            self.data[user_id] = (time.monotonic() + self.ttl, fields)
+            while len(self.data) > self.maxsize:
+                self.data.pop(next(iter(self.data)))
+
+    def invalidate(self, user_id):
+        if self.redis is not None:
+            self.redis.delete(f"{self.prefix}:{user_id}")
+        with self._lock:
+            self.data.pop(user_id, None)
+
+
+def get_cache():
+    cache = current_app.extensions.get("principal_cache")
+    if cache is None:
+        cache = PrincipalCache(current_app.config["USER_CACHE_TTL"], get_redis())
+        cache = current_app.extensions.setdefault("principal_cache", cache)
+        instrumentation.track_cache("principal", cache)
+    return cache
+
+
+def load(user_id):
+    try:
+        user_id = int(user_id)
+    except (TypeError, ValueError):
+        return None
+    cache = get_cache()
+    fields = cache.get(user_id)
+    if fields is None:
+        row = db.session.execute(
+            select(*[getattr(User, name) for name in FIELDS]).where(User.id == user_id)
+        ).first()
+        if row is None:
+            return None
+        fields = dict(row._mapping)
+        cache.set(user_id, fields)
+    return Principal(**fields)
+
+
+def invalidate(user_id):
+    get_cache().invalidate(int(user_id))
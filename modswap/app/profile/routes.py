@@ -1,34 +1,66 @@
-import os
 import json
-from flask import Blueprint, render_template, request, redirect, url_for, current_app, flash, jsonify
+from flask import Blueprint, abort, render_template, request, redirect, url_for, current_app, flash
 from flask_login import login_required, current_user
-from werkzeug.utils import secure_filename
+from sqlalchemy import and_, or_
+from sqlalchemy.exc import IntegrityError
 from ..extensions import db
-from ..models import User, Module, SwapRequest, Document, Notification
+from .. import dispatch, exports, inbox, principal, stats
+from ..models import User, Module, SwapRequest, Document, has_open_duplicate, module_signature
+from ..alerts import notify_matches
+from ..matching import get_swap_index
+from ..instrumentation import query_budget
+from ..pagination import make_cursor, parse_cursor
+from ..storage import UploadTooLarge, delete_if_unreferenced, get_storage, in_background, make_thumbnail
 
 profile_bp = Blueprint("profile", __name__, template_folder="templates")
 
 ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg", "gif"}
+DOCUMENT_EXTENSIONS = ALLOWED_EXTENSIONS | {"pdf"}
 
-def allowed_file(filename):
-    return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
+# Room for the other fields of a multipart form next to its file.
+FORM_OVERHEAD = 64 * 1024
+
+def allowed_file(filename, extensions=ALLOWED_EXTENSIONS):
+    return "." in filename and filename.rsplit(".", 1)[1].lower() in extensions
+
+def body_too_large(max_bytes):
+    # Checked before the form is parsed, so an oversized body is never
+    # spooled to disk; save() still enforces the limit on the file itself.
+    if request.content_length is None:
+        # A chunked body has no length to check up front.
+        abort(411)
+    return request.content_length > max_bytes + FORM_OVERHEAD
 
 @profile_bp.get("/")
 @login_required
+@query_budget(7)
 def view_profile():
+    page = db.select(SwapRequest).filter_by(user_id=current_user.id)
+    cursor = parse_cursor(request.args.get("after"))
+    if cursor:
+        created, sid = cursor
+        page = page.where(or_(
+            SwapRequest.created_at < created,
+            and_(SwapRequest.created_at == created, SwapRequest.id < sid),
+        ))
+    per_page = current_app.config["PROFILE_PAGE_SIZE"]
     swaps = db.session.execute(
-        db.select(SwapRequest).filter_by(user_id=current_user.id).order_by(SwapRequest.created_at.desc())
+        page.order_by(SwapRequest.created_at.desc(), SwapRequest.id.desc()).limit(per_page + 1)
     ).scalars().all()
-    stats = {
-        "requests": len(swaps),
-        "approved": sum(1 for s in swaps if s.status == "Approved"),
-        "rejected": sum(1 for s in swaps if s.status == "Rejected"),
-    }
-    return render_template("profile/view.html", user=current_user, swaps=swaps, stats=stats)
+    next_url = None
+    if len(swaps) > per_page:
+        swaps = swaps[:per_page]
+        next_url = url_for("profile.view_profile", after=make_cursor(swaps[-1]))
+    first_url = url_for("profile.view_profile") if cursor else None
+    return render_template("profile/view.html", user=current_user, swaps=swaps, stats=stats.for_user(current_user.id),
+                           next_url=next_url, first_url=first_url)
 
 @profile_bp.post("/")
 @login_required
 def update_profile():
+    if body_too_large(current_app.config["AVATAR_MAX_BYTES"]):
+        flash("Image is too large")
+        return redirect(url_for("profile.view_profile"))
     u = db.session.get(User, current_user.id)
     u.degree = request.form.get("degree") or u.degree
     u.year = int(request.form.get("year") or u.year or 0) or None
@@ -43,19 +75,25 @@ def update_profile():
     u.show_modules = request.form.get("show_modules") == "on"
     u.show_bio = request.form.get("show_bio") == "on"
     u.consent_data_usage = request.form.get("consent_data_usage") == "on"
+    old = u.profile_image
     file = request.files.get("avatar")
     if file and file.filename != "":
         if not allowed_file(file.filename):
             flash("Invalid image type")
             return redirect(url_for("profile.view_profile"))
-        uploads_dir = os.path.join(current_app.root_path, "static", "uploads")
-        os.makedirs(uploads_dir, exist_ok=True)
-        ext = file.filename.rsplit(".", 1)[1].lower()
-        filename = f"user_{current_user.id}.{ext}"
-        filepath = os.path.join(uploads_dir, secure_filename(filename))
-        file.save(filepath)
-        u.profile_image = f"uploads/{filename}"
+        try:
+            key = get_storage().save(file.stream, "avatars", file.filename.rsplit(".", 1)[1].lower(),
+                                     current_app.config["AVATAR_MAX_BYTES"])
+        except UploadTooLarge:
+            flash("Image is too large")
+            return redirect(url_for("profile.view_profile"))
+        u.profile_image = key
     db.session.commit()
+    principal.invalidate(current_user.id)
+    if u.profile_image != old:
+        in_background(make_thumbnail, u.profile_image)
+        if old:
+            in_background(delete_if_unreferenced, old)
     flash("Profile updated")
     return redirect(url_for("profile.view_profile"))
 
@@ -64,14 +102,10 @@ def update_profile():
 def delete_avatar():
     u = db.session.get(User, current_user.id)
     if u.profile_image:
-        path = os.path.join(current_app.root_path, "static", u.profile_image)
-        if os.path.exists(path):
-            try:
-                os.remove(path)
-            except Exception:
-                pass
-        u.profile_image = None
+        old, u.profile_image = u.profile_image, None
         db.session.commit()
+        principal.invalidate(current_user.id)
+        in_background(delete_if_unreferenced, old)
     flash("Avatar deleted")
     return redirect(url_for("profile.view_profile"))
 
@@ -98,48 +132,56 @@ def wishlist_remove():
 @profile_bp.post("/wishlist/create_request")
 @login_required
 def wishlist_create_request():
-    swap = SwapRequest(user_id=current_user.id)
-    for m in current_user.wishlist:
-        swap.wanting.append(m)
+    wanting = list(current_user.wishlist)
+    signature = module_signature([], [m.id for m in wanting])
+    swap = SwapRequest(user_id=current_user.id, wanting=wanting, module_signature=signature)
     db.session.add(swap)
-    db.session.commit()
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        if not has_open_duplicate(current_user.id, signature):
+            raise
+        flash("Duplicate request already exists")
+        return redirect(url_for("profile.view_profile"))
+    index = get_swap_index()
+    index.add(swap)
+    notify_matches(swap, index)
     flash("Swap request created from wishlist")
     return redirect(url_for("profile.view_profile"))
 
 @profile_bp.get("/export")
 @login_required
 def export_profile():
-    data = {
-        "email": current_user.email,
-        "university": current_user.university,
-        "degree": current_user.degree,
-        "year": current_user.year,
-        "department": current_user.department,
-        "bio": current_user.bio,
-        "interests": current_user.interests,
-        "modules": [{"code": m.code, "name": m.name} for m in current_user.modules],
-    }
-    return jsonify(data)
+    return exports.respond(exports.user_export(current_user.id), "ndjson", f"modswap-export-{current_user.id}")
 
 @profile_bp.post("/documents/upload")
 @login_required
 def upload_document():
+    if body_too_large(current_app.config["DOCUMENT_MAX_BYTES"]):
+        flash("Document is too large")
+        return redirect(url_for("profile.view_profile"))
     dtype = request.form.get("type") or "student_id"
     file = request.files.get("document")
     if not file or file.filename == "":
         flash("Select a document to upload")
         return redirect(url_for("profile.view_profile"))
-    uploads_dir = os.path.join(current_app.root_path, "static", "docs")
-    os.makedirs(uploads_dir, exist_ok=True)
-    ext = file.filename.rsplit(".", 1)[1].lower()
-    filename = f"doc_{current_user.id}_{dtype}.{ext}"
-    filepath = os.path.join(uploads_dir, secure_filename(filename))
-    file.save(filepath)
-    doc = Document(user_id=current_user.id, type=dtype, path=f"docs/{filename}", status="Pending")
+    if not allowed_file(file.filename, DOCUMENT_EXTENSIONS):
+        flash("Invalid document type")
+        return redirect(url_for("profile.view_profile"))
+    try:
+        key = get_storage().save(file.stream, "docs", file.filename.rsplit(".", 1)[1].lower(),
+                                 current_app.config["DOCUMENT_MAX_BYTES"])
+    except UploadTooLarge:
+        flash("Document is too large")
+        return redirect(url_for("profile.view_profile"))
+    doc = Document(user_id=current_user.id, type=dtype, path=key, status="Pending")
     db.session.add(doc)
-    u = db.session.get(User, current_user.id)
-    u.student_id_status = "Pending"
+    if dtype == "student_id":
+        u = db.session.get(User, current_user.id)
+        u.student_id_status = "Pending"
     db.session.commit()
+    principal.invalidate(current_user.id)
     flash("Document uploaded")
     return redirect(url_for("profile.view_profile"))
 
@@ -152,8 +194,7 @@ def add_reminder():
         "date": request.form.get("deadline_date") or "",
         "note": request.form.get("deadline_note") or "",
     }
-    n = Notification(user_id=current_user.id, type="deadline", payload=json.dumps(payload))
-    db.session.add(n)
-    db.session.commit()
+    inbox.notify([{"user_id": current_user.id, "type": "deadline", "payload": json.dumps(payload)}])
+    dispatch.enqueue([current_user.id])
     flash("Reminder added")
     return redirect(url_for("profile.view_profile"))
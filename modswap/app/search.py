@@ -0,0 +1,181 @@
+import difflib
+import re
+import time
+from flask import current_app
+from sqlalchemy import Integer, and_, column, func, literal_column, or_, select, text
+from .extensions import db
+from .models import Module, SwapRequest, swap_give_modules, swap_want_modules
+
+
+SQLITE_SETUP = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS modules_fts USING fts5(code, name, department, content='modules', content_rowid='id')",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS modules_fts_vocab USING fts5vocab(modules_fts, 'row')",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS swap_notes_fts USING fts5(notes, content='swap_requests', content_rowid='id')",
+    """CREATE TRIGGER IF NOT EXISTS modules_fts_ai AFTER INSERT ON modules BEGIN
+        INSERT INTO modules_fts(rowid, code, name, department) VALUES (new.id, new.code, new.name, new.department);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS modules_fts_ad AFTER DELETE ON modules BEGIN
+        INSERT INTO modules_fts(modules_fts, rowid, code, name, department) VALUES ('delete', old.id, old.code, old.name, old.department);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS modules_fts_au AFTER UPDATE ON modules BEGIN
+        INSERT INTO modules_fts(modules_fts, rowid, code, name, department) VALUES ('delete', old.id, old.code, old.name, old.department);
+        INSERT INTO modules_fts(rowid, code, name, department) VALUES (new.id, new.code, new.name, new.department);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS swap_notes_fts_ai AFTER INSERT ON swap_requests BEGIN
+        INSERT INTO swap_notes_fts(rowid, notes) VALUES (new.id, new.notes);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS swap_notes_fts_ad AFTER DELETE ON swap_requests BEGIN
+        INSERT INTO swap_notes_fts(swap_notes_fts, rowid, notes) VALUES ('delete', old.id, old.notes);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS swap_notes_fts_au AFTER UPDATE OF notes ON swap_requests BEGIN
+        INSERT INTO swap_notes_fts(swap_notes_fts, rowid, notes) VALUES ('delete', old.id, old.notes);
+        INSERT INTO swap_notes_fts(rowid, notes) VALUES (new.id, new.notes);
+    END""",
+]
+
+MODULE_DOCUMENT = "coalesce(modules.code, '') || ' ' || coalesce(modules.name, '') || ' ' || coalesce(modules.department, '')"
+NOTES_DOCUMENT = "coalesce(swap_requests.notes, '')"
+
+POSTGRES_SETUP = [
+    f"CREATE INDEX IF NOT EXISTS ix_modules_search ON modules USING GIN (to_tsvector('simple', {MODULE_DOCUMENT}))",
+    f"CREATE INDEX IF NOT EXISTS ix_swap_requests_notes_search ON swap_requests USING GIN (to_tsvector('simple', {NOTES_DOCUMENT}))",
+]
+
+
+def detect_backend(conn):
+    if conn.dialect.name == "postgresql":
+        return "tsvector"
+    if conn.dialect.name == "sqlite":
+        found = conn.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'modules_fts'")).first()
+        return "fts5" if found else "like"
+    return "like"
+
+
+def install(conn):
+    if conn.dialect.name == "postgresql":
+        for statement in POSTGRES_SETUP:
+            conn.execute(text(statement))
+    elif conn.dialect.name == "sqlite":
+        if not conn.execute(text("SELECT sqlite_compileoption_used('ENABLE_FTS5')")).scalar():
+            # SQLite built without FTS5: searches fall back to LIKE scans.
+            return
+        fresh = conn.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'modules_fts'")).first() is None
+        for statement in SQLITE_SETUP:
+            conn.execute(text(statement))
+        if fresh:
+            conn.execute(text("INSERT INTO modules_fts(modules_fts) VALUES ('rebuild')"))
+            conn.execute(text("INSERT INTO swap_notes_fts(swap_notes_fts) VALUES ('rebuild')"))
+
+
+def backend():
+    found = current_app.extensions.get("search_backend")
+    if found is None:
+        with db.engine.connect() as conn:
+            found = current_app.extensions["search_backend"] = detect_backend(conn)
+    return found
+
+
+def terms(q):
+    return re.findall(r"\w+", (q or "").lower())
+
+
+def vocabulary():
+    cached = current_app.extensions.get("search_vocab")
+    ttl = current_app.config["SEARCH_VOCAB_TTL"]
+    if cached and time.monotonic() - cached[0] < ttl:
+        return cached[1]
+    if backend() == "fts5":
+        sql = "SELECT term FROM modules_fts_vocab"
+    elif backend() == "tsvector":
+        sql = f"SELECT word FROM ts_stat($$SELECT to_tsvector('simple', {MODULE_DOCUMENT}) FROM modules$$)"
+    else:
+        return []
+    words = [w for (w,) in db.session.execute(text(sql)) if re.fullmatch(r"\w+", w)]
+    current_app.extensions["search_vocab"] = (time.monotonic(), words)
+    return words
+
+
+def _expression(words, fuzzy):
+    # Every term is a prefix match; with ``fuzzy`` each one may also be any
+    # close spelling from the module vocabulary.
+    vocab = vocabulary() if fuzzy else []
+    parts = []
+    for word in words:
+        options = [word] + [w for w in difflib.get_close_matches(word, vocab, n=3, cutoff=0.75) if w != word]
+        if backend() == "fts5":
+            alts = [f'"{word}"*'] + [f'"{w}"' for w in options[1:]]
+            parts.append("(" + " OR ".join(alts) + ")")
+        else:
+            alts = [f"{word}:*"] + options[1:]
+            parts.append("(" + " | ".join(alts) + ")")
+    return (" AND " if backend() == "fts5" else " & ").join(parts)
+
+
+def _module_query(expression, limit=None):
+    if backend() == "fts5":
+        sql = "SELECT rowid AS id FROM modules_fts WHERE modules_fts MATCH :expr ORDER BY rank"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        return text(sql).bindparams(expr=expression).columns(column("id", Integer))
+    document = func.to_tsvector("simple", literal_column(MODULE_DOCUMENT))
+    query = func.to_tsquery("simple", expression)
+    return select(Module.id).where(document.op("@@")(query)).order_by(func.ts_rank(document, query).desc()).limit(limit)
+
+
+def _like_modules(words, limit=None):
+    conditions = []
+    for word in words:
+        conditions.append(or_(
+            func.lower(Module.code).contains(word, autoescape=True),
+            func.lower(Module.name).contains(word, autoescape=True),
+            func.lower(Module.department).contains(word, autoescape=True),
+        ))
+    return select(Module.id).where(*conditions).order_by(Module.code).limit(limit)
+
+
+def module_ids_query(q, limit=None):
+    words = terms(q)
+    if not words:
+        return None
+    if backend() == "like":
+        return _like_modules(words, limit)
+    exact = _module_query(_expression(words, fuzzy=False), limit)
+    if db.session.execute(select(literal_column("1")).select_from(exact.subquery()).limit(1)).first():
+        return exact
+    return _module_query(_expression(words, fuzzy=True), limit)
+
+
+def search_modules(q, limit=20):
+    ids_query = module_ids_query(q, limit)
+    if ids_query is None:
+        return []
+    ids = [mid for (mid,) in db.session.execute(ids_query)]
+    by_id = {m.id: m for m in db.session.execute(select(Module).where(Module.id.in_(ids))).scalars()} if ids else {}
+    return [by_id[mid] for mid in ids if mid in by_id]
+
+
+def _notes_clause(words):
+    if backend() == "fts5":
+        expression = " AND ".join(f'"{w}"*' for w in words)
+        return SwapRequest.id.in_(
+            text("SELECT rowid AS id FROM swap_notes_fts WHERE swap_notes_fts MATCH :notes_expr")
+            .bindparams(notes_expr=expression).columns(column("id", Integer))
+        )
+    if backend() == "tsvector":
+        document = func.to_tsvector("simple", literal_column(NOTES_DOCUMENT))
+        return document.op("@@")(func.to_tsquery("simple", " & ".join(f"{w}:*" for w in words)))
+    return and_(*[func.lower(SwapRequest.notes).contains(w, autoescape=True) for w in words])
+
+
+def swap_search_clause(q, notes=True):
+    words = terms(q)
+    if not words:
+        return None
+    module_ids = module_ids_query(q)
+    clauses = [
+        SwapRequest.id.in_(select(swap_give_modules.c.swap_id).where(swap_give_modules.c.module_id.in_(module_ids))),
+        SwapRequest.id.in_(select(swap_want_modules.c.swap_id).where(swap_want_modules.c.module_id.in_(module_ids))),
+    ]
+    if notes:
+        clauses.append(_notes_clause(words))
+    return or_(*clauses)
@@ -0,0 +1,77 @@
+from sqlalchemy import insert, select
+from .extensions import db, bcrypt
+from .models import User, Module
+from . import catalogue
+
+
+SEED_MODULES = [
+    ("BCU-CS-101", "Introduction to Programming", "Computing and Digital Technology", "BCU", 1),
+    ("BCU-CS-201", "Data Structures and Algorithms", "Computing and Digital Technology", "BCU", 2),
+    ("BCU-BS-101", "Principles of Marketing", "Business", "BCU", 1),
+    ("BCU-BS-201", "Financial Accounting", "Business", "BCU", 2),
+    ("BCU-HS-101", "Foundations of Health Studies", "Health Sciences", "BCU", 1),
+    ("BCU-HS-201", "Public Health and Policy", "Health Sciences", "BCU", 2),
+    ("BCU-SS-101", "Introduction to Sociology", "Social Sciences", "BCU", 1),
+    ("BCU-ED-101", "Educational Psychology", "Education", "BCU", 1),
+]
+
+# Applied in order, so a later entry for the same email overrides fields of
+# an earlier one (the admin address is also a seeded student account).
+SEED_USERS = [
+    {"email": "vikramjeet.-3@mail.bcu.ac.uk", "password": "Vansh@123", "role": "teacher"},
+    {"email": "vikramjeet.-3@mail.bcu.ac.uk", "password": "Vansh@123", "role": "student",
+     "username": "vikramjeet", "verified_ac_email": True},
+    {"email": "rajveer.saini@mail.bcu.ac.uk", "password": "Raj@123", "role": "student",
+     "username": "rajveer", "verified_ac_email": True},
+]
+
+
+def seed_modules(modules=SEED_MODULES):
+    codes = [code for code, *_ in modules]
+    existing = set(db.session.execute(select(Module.code).where(Module.code.in_(codes))).scalars())
+    rows = [
+        {"code": code, "name": name, "department": dept, "university": uni, "year": year}
+        for code, name, dept, uni, year in modules
+        if code not in existing
+    ]
+    if rows:
+        db.session.execute(insert(Module), rows)
+    return len(rows)
+
+
+def seed_users(users=SEED_USERS):
+    merged = {}
+    for spec in users:
+        merged.setdefault(spec["email"], {}).update(spec)
+    existing = {
+        u.email: u for u in db.session.execute(select(User).where(User.email.in_(list(merged)))).scalars()
+    }
+    created = updated = 0
+    for email, spec in merged.items():
+        fields = {k: v for k, v in spec.items() if k not in ("email", "password")}
+        user = existing.get(email)
+        if user is None:
+            uni = email.split("@")[1].replace(".ac.uk", "")
+            pw = bcrypt.generate_password_hash(spec["password"]).decode("utf-8")
+            db.session.add(User(email=email, university=uni, password_hash=pw, **fields))
+            created += 1
+            continue
+        changed = False
+        for key, value in fields.items():
+            if getattr(user, key, None) != value:
+                setattr(user, key, value)
+                changed = True
+        if not user.password_hash:
+            user.password_hash = bcrypt.generate_password_hash(spec["password"]).decode("utf-8")
+            changed = True
+        updated += changed
+    return created, updated
+
+
+def run():
+    modules = seed_modules()
+    created, updated = seed_users()
+    db.session.commit()
+    if modules:
+        catalogue.bump()
+    return {"modules": modules, "users_created": created, "users_updated": updated}
@@ -0,0 +1,43 @@
+from sqlalchemy import func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from .extensions import db
+from .models import SwapRequest, UserSwapStats
+
+
+COUNTERS = ("approved", "rejected", "expired", "matches")
+
+
+def upsert_statement():
+    dialect = db.engine.dialect.name
+    if dialect == "postgresql":
+        stmt = postgresql.insert(UserSwapStats.__table__)
+    elif dialect == "sqlite":
+        stmt = sqlite.insert(UserSwapStats.__table__)
+    else:
+        raise RuntimeError(f"user stats do not support {dialect}")
+    table = UserSwapStats.__table__
+    return stmt.on_conflict_do_update(
+        index_elements=["user_id"],
+        set_={name: table.c[name] + stmt.excluded[name] for name in COUNTERS},
+    )
+
+
+def add(conn, counts):
+    """Add ``{user_id: {counter: n}}`` to the summary rows in the caller's transaction."""
+    if counts:
+        conn.execute(upsert_statement(), [
+            {"user_id": uid, **{name: deltas.get(name, 0) for name in COUNTERS}} for uid, deltas in counts.items()
+        ])
+
+
+def for_user(user_id):
+    # Resolved swaps are counted as they are archived; live ones are counted
+    # here, in one grouped query on the user's index.
+    summary = db.session.get(UserSwapStats, user_id)
+    stats = {name: getattr(summary, name) if summary else 0 for name in COUNTERS}
+    live = db.session.execute(
+        select(SwapRequest.status, func.count()).where(SwapRequest.user_id == user_id).group_by(SwapRequest.status)
+    ).all()
+    stats["open"] = sum(n for status, n in live if status is None or status == "Open")
+    stats["requests"] = sum(n for _, n in live) + sum(stats[name] for name in ("approved", "rejected", "expired"))
+    return stats
@@ -0,0 +1,218 @@
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from flask import Request, current_app, url_for
+from sqlalchemy import func, select
+from .extensions import db, socketio
+from .models import Document, User
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+log = logging.getLogger(__name__)
+
+THUMBNAIL_SIZE = (256, 256)
+
+
+class UploadTooLarge(ValueError):
+    pass
+
+
+class LimitedRequest(Request):
+    """Caps every body at MAX_CONTENT_LENGTH unless its view opts out."""
+
+    @property
+    def max_content_length(self):
+        view = current_app.view_functions.get(self.endpoint) if self.endpoint else None
+        if view is not None and hasattr(view, "max_content_length"):
+            return view.max_content_length
+        return current_app.config["MAX_CONTENT_LENGTH"]
+
+
+def no_body_limit(view):
+    # For views that stream a large body themselves, e.g. the catalogue import.
+    view.max_content_length = None
+    return view
+
+
+class LocalStorage:
+    """Uploads on the local filesystem under content-hash names.
+
+    A key is ``<prefix>/<aa>/<sha256>.<ext>``: the same bytes always land on
+    the same key, so re-uploads and identical files are stored once and the
+    served file never changes.
+    """
+
+    def __init__(self, root, chunk_size=64 * 1024):
+        self.root = root
+        self.chunk_size = chunk_size
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def locked(self):
+        # Orders a save that reuses an existing file against a delete of it,
+        # across threads and, where flock exists, worker processes.
+        os.makedirs(self.root, exist_ok=True)
+        with self._lock, open(os.path.join(self.root, ".lock"), "a") as handle:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_EX)
+            yield
+
+    def path(self, key):
+        return os.path.join(self.root, *key.split("/"))
+
+    def exists(self, key):
+        return os.path.exists(self.path(key))
+
+    def save(self, stream, prefix, ext, max_bytes):
+        """Copy ``stream`` in chunks while hashing it; returns the key."""
+        tmp_dir = os.path.join(self.root, "tmp")
+        os.makedirs(tmp_dir, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+        try:
+            with os.fdopen(fd, "wb") as out:
+                while chunk := stream.read(self.chunk_size):
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise UploadTooLarge(f"upload exceeds {max_bytes} bytes")
+                    digest.update(chunk)
+                    out.write(chunk)
+            key = f"{prefix}/{digest.hexdigest()[:2]}/{digest.hexdigest()}.{ext}"
+            path = self.path(key)
+            with self.locked():
+                if os.path.exists(path):
+                    # Marks the shared file as just reused; see delete_unused().
+                    os.utime(path)
+                    os.remove(tmp_path)
+                else:
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    os.replace(tmp_path, path)
+            return key
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def age(self, key):
+        try:
+            return time.time() - os.path.getmtime(self.path(key))
+        except FileNotFoundError:
+            return None
+
+    def delete(self, key):
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    def delete_unused(self, key, in_use, grace):
+        """Delete ``key`` unless ``in_use(key)`` or a save reused it in the last ``grace`` seconds.
+
+        The reference that such a save is about to commit is not visible to
+        ``in_use`` yet, so a recent save keeps the file. Returns whether it went.
+        """
+        with self.locked():
+            age = self.age(key)
+            if age is None or age < grace or in_use(key):
+                return False
+            self.delete(key)
+            return True
+
+
+def get_storage():
+    storage = current_app.extensions.get("storage")
+    if storage is None:
+        backend = current_app.config["STORAGE_BACKEND"]
+        if backend != "local":
+            raise RuntimeError(f"unknown storage backend {backend}")
+        root = current_app.config["MEDIA_ROOT"] or os.path.join(current_app.instance_path, "media")
+        storage = current_app.extensions.setdefault("storage", LocalStorage(root))
+    return storage
+
+
+def is_legacy(key):
+    # Files saved before the storage backend still live under static/, one
+    # level deep (uploads/user_1.png); stored keys have a fan-out directory.
+    return key.startswith(("uploads/", "docs/")) and key.count("/") == 1
+
+
+def thumbnail_key(key):
+    name = key.rsplit("/", 1)[-1].rsplit(".", 1)[0]
+    return f"thumbs/{name[:2]}/{name}.jpg"
+
+
+def media_url(key, variant=None):
+    if not key:
+        return None
+    if is_legacy(key):
+        return url_for("static", filename=key)
+    if variant == "thumb" and get_storage().exists(thumbnail_key(key)):
+        key = thumbnail_key(key)
+    return url_for("media.serve", key=key)
+
+
+def make_thumbnail(key):
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    storage = get_storage()
+    target = thumbnail_key(key)
+    if storage.exists(target):
+        return target
+    path = storage.path(target)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with Image.open(storage.path(key)) as image:
+        image.thumbnail(THUMBNAIL_SIZE)
+        image.convert("RGB").save(path + ".part", "JPEG", quality=85)
+    os.replace(path + ".part", path)
+    return target
+
+
+def references(key):
+    return db.session.execute(
+        select(func.count()).select_from(User).where(User.profile_image == key)
+    ).scalar() + db.session.execute(
+        select(func.count()).select_from(Document).where(Document.path == key)
+    ).scalar()
+
+
+def delete_if_unreferenced(key):
+    # Identical uploads share a file, so it goes only with its last user.
+    if is_legacy(key):
+        path = os.path.join(current_app.static_folder, key)
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    storage = get_storage()
+    grace = current_app.config["MEDIA_DELETE_GRACE"]
+    age = storage.age(key)
+    if age is None:
+        return
+    if age < grace:
+        socketio.sleep(grace - age)
+    if storage.delete_unused(key, lambda k: references(k) > 0, grace):
+        storage.delete(thumbnail_key(key))
+
+
+def in_background(fn, *args):
+    """Run ``fn`` after the request, with its own app context."""
+    app = current_app._get_current_object()
+
+    def run():
+        try:
+            with app.app_context():
+                fn(*args)
+        except Exception:
+            log.exception("background %s(%s) failed", fn.__name__, ", ".join(map(str, args)))
+
+    socketio.start_background_task(run)
@@ -1,7 +1,15 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session
+from datetime import datetime, timezone
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, current_app, jsonify, make_response
 from flask_login import login_required, current_user
+from sqlalchemy.exc import IntegrityError
 from ..extensions import db
-from ..models import Module, SwapRequest
+from .. import catalogue
+from ..models import Module, SwapRequest, has_open_duplicate, module_signature, swap_loader_options
+from ..alerts import notify_matches
+from ..matching import get_swap_index, open_clause
+from ..chains import get_chains
+from ..instrumentation import query_budget
+from ..search import search_modules, swap_search_clause
 
 
 swaps_bp = Blueprint("swaps", __name__, template_folder="templates")
@@ -9,33 +17,58 @@ swaps_bp = Blueprint("swaps", __name__, template_folder="templates")
 
 @swaps_bp.get("/")
 @login_required
+@query_budget(6)
 def browse():
     if session.get("role") == "teacher":
         return redirect(url_for("admin.swaps"))
+    base = db.select(SwapRequest).filter_by(user_id=current_user.id)
+    clause = swap_search_clause(request.args.get("q", ""), notes=False)
+    if clause is not None:
+        base = base.where(clause)
     swaps = db.session.execute(
-        db.select(SwapRequest)
-        .filter_by(user_id=current_user.id)
-        .order_by(SwapRequest.created_at.desc())
+        base.order_by(SwapRequest.created_at.desc()).options(*swap_loader_options(user=True))
     ).scalars().all()
-    query = request.args.get("q", "").strip().lower()
-    if query:
-        def match_swap(s):
-            items = list(s.giving) + list(s.wanting)
-            for m in items:
-                if query in (m.code or "").lower() or query in (m.name or "").lower() or query in (m.department or "").lower():
-                    return True
-            return False
-        swaps = [s for s in swaps if match_swap(s)]
     return render_template("swaps/browse.html", swaps=swaps, q=request.args.get("q", ""))
 
 
 @swaps_bp.get("/create")
 @login_required
+@query_budget(2)
 def create():
     if session.get("role") == "teacher":
         return redirect(url_for("admin.swaps"))
-    modules = db.session.execute(db.select(Module).order_by(Module.department, Module.year, Module.code)).scalars().all()
-    return render_template("swaps/create.html", modules=modules)
+    response = make_response(render_template(
+        "swaps/create.html", give_options=catalogue.options("give"), want_options=catalogue.options("want")
+    ))
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.add_etag()
+    return response.make_conditional(request)
+
+
+@swaps_bp.get("/modules")
+@login_required
+@query_budget(2)
+def module_catalogue():
+    data = catalogue.payload()
+    response = current_app.response_class(data["body"], mimetype="application/json")
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.set_etag(data["etag"])
+    response.last_modified = datetime.fromtimestamp(data["last_modified"], timezone.utc)
+    return response.make_conditional(request)
+
+
+@swaps_bp.get("/modules/search")
+@login_required
+@query_budget(6)
+def module_search():
+    limit = min(request.args.get("limit", 20, type=int), 100)
+    modules = search_modules(request.args.get("q", ""), limit=limit)
+    return jsonify([
+        {"id": m.id, "code": m.code, "name": m.name, "department": m.department, "year": m.year}
+        for m in modules
+    ])
 
 
 @swaps_bp.post("/create")
@@ -64,17 +97,15 @@ def create_post():
     if set(give_ids) & set(want_ids):
         flash("You cannot give and want the same module")
         return redirect(url_for("swaps.create"))
-    existing_open = db.session.execute(
-        db.select(SwapRequest).filter_by(user_id=current_user.id, status="Open")
-    ).scalars().all()
-    gi_set = {int(x) for x in give_ids}
-    wi_set = {int(x) for x in want_ids}
-    for s in existing_open:
-        s_g = {m.id for m in s.giving}
-        s_w = {m.id for m in s.wanting}
-        if s_g == gi_set and s_w == wi_set:
-            flash("Duplicate request already exists")
-            return redirect(url_for("swaps.create"))
+    modules = {m.id: m for m in db.session.execute(
+        db.select(Module).where(Module.id.in_({int(x) for x in give_ids + want_ids}))
+    ).scalars()}
+    giving = [modules[int(mid)] for mid in give_ids if int(mid) in modules]
+    wanting = [modules[int(mid)] for mid in want_ids if int(mid) in modules]
+    signature = module_signature([m.id for m in giving], [m.id for m in wanting])
+    if has_open_duplicate(current_user.id, signature):
+        flash("Duplicate request already exists")
+        return redirect(url_for("swaps.create"))
 
     swap = SwapRequest(user_id=current_user.id,
                     notes=notes,
@@ -84,7 +115,8 @@ def create_post():
                     module_group_pref=module_group_pref,
                     visibility=visibility,
                     alerts_email=alerts_email,
-                    auto_create_chat=auto_create_chat)
+                    auto_create_chat=auto_create_chat,
+                    module_signature=signature)
     if expires_on:
         try:
             from datetime import datetime
@@ -92,34 +124,58 @@ def create_post():
         except Exception:
             flash("Invalid expiry date format, use YYYY-MM-DD")
             return redirect(url_for("swaps.create"))
-    for mid in give_ids:
-        if m := db.session.get(Module, int(mid)):
-            swap.giving.append(m)
-    for mid in want_ids:
-        if m := db.session.get(Module, int(mid)):
-            swap.wanting.append(m)
+    swap.giving = giving
+    swap.wanting = wanting
     db.session.add(swap)
-    db.session.commit()
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        # Only a lost race with an identical submission is the user's doing.
+        if not has_open_duplicate(current_user.id, signature):
+            raise
+        flash("Duplicate request already exists")
+        return redirect(url_for("swaps.create"))
+    index = get_swap_index()
+    index.add(swap)
+    notify_matches(swap, index)
     return redirect(url_for("swaps.browse"))
 
 @swaps_bp.post("/suggest")
 @login_required
+@query_budget(6)
 def suggest():
     give_ids = {int(x) for x in request.form.getlist("give")}
     want_ids = {int(x) for x in request.form.getlist("want")}
-    others = db.session.execute(
-        db.select(SwapRequest).filter(SwapRequest.user_id != current_user.id)
-    ).scalars().all()
-    suggestions = []
-    for s in others:
-        s_g = {m.id for m in s.giving}
-        s_w = {m.id for m in s.wanting}
-        score = 0
-        if s_w & give_ids:
-            score += len(s_w & give_ids)
-        if s_g & want_ids:
-            score += len(s_g & want_ids)
-        if score > 0:
-            suggestions.append({"swap": s, "score": score})
-    suggestions.sort(key=lambda x: x["score"], reverse=True)
+    top = get_swap_index().match(give_ids, want_ids, exclude_user=current_user.id, k=current_app.config["SUGGEST_LIMIT"])
+    rows = db.session.execute(
+        db.select(SwapRequest).filter(SwapRequest.id.in_([sid for sid, _ in top]))
+    ).scalars().all() if top else []
+    by_id = {s.id: s for s in rows}
+    suggestions = [{"swap": by_id[sid], "score": score} for sid, score in top if sid in by_id]
     return render_template("swaps/_suggestions.html", suggestions=suggestions)
+
+
+@swaps_bp.get("/chains")
+@login_required
+@query_budget(7)
+def chains():
+    if session.get("role") == "teacher":
+        return redirect(url_for("admin.chains"))
+    mine = [c for c in get_chains() if current_user.id in c["users"]]
+    # The chains were found on this process's index, which may still hold a
+    # swap another process has since closed.
+    swap_ids = {sid for c in mine for sid in c["swaps"]}
+    live = set(db.session.execute(
+        db.select(SwapRequest.id).where(SwapRequest.id.in_(swap_ids), open_clause())
+    ).scalars()) if swap_ids else set()
+    mine = [c for c in mine if all(sid in live for sid in c["swaps"])]
+    module_ids = {mid for c in mine for mid in c["modules"]}
+    modules_by_id = {m.id: m for m in db.session.execute(
+        db.select(Module).filter(Module.id.in_(module_ids))
+    ).scalars()} if module_ids else {}
+    rows = []
+    for c in mine:
+        links = [{"user_id": uid, "module": modules_by_id.get(mid)} for uid, mid in zip(c["users"], c["modules"])]
+        rows.append({"length": c["length"], "links": links})
+    return render_template("swaps/chains.html", chains=rows)
@@ -0,0 +1,167 @@
+import threading
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import func, or_, select, update
+from .extensions import db
+from .models import Document, User
+from .moderation import chunked
+from . import instrumentation, principal
+
+
+OUTCOMES = ("Approved", "Rejected")
+
+
+class Throughput:
+    """Documents reviewed by this process, by outcome."""
+
+    def __init__(self):
+        self.totals = dict.fromkeys(OUTCOMES, 0)
+        self._lock = threading.Lock()
+
+    def observe(self, outcome, count):
+        with self._lock:
+            self.totals[outcome] += count
+
+
+def get_throughput():
+    return current_app.extensions.setdefault("review_throughput", Throughput())
+
+
+def lease_open(now):
+    return or_(Document.claimed_until.is_(None), Document.claimed_until < now)
+
+
+def claim(moderator_id, limit=None, lease=None):
+    """Lease the oldest unclaimed pending documents to ``moderator_id``.
+
+    Several moderators can claim at once: on Postgres concurrent claims skip
+    each other's rows, elsewhere the single UPDATE is atomic. A lease that
+    runs out puts its documents back in the backlog.
+    """
+    limit = limit or current_app.config["REVIEW_CLAIM_BATCH"]
+    lease = lease or current_app.config["REVIEW_LEASE"]
+    now = datetime.utcnow()
+    backlog = (
+        select(Document.id)
+        .where(Document.status == "Pending", lease_open(now))
+        .order_by(Document.created_at)
+        .limit(limit)
+    )
+    if db.engine.dialect.name == "postgresql":
+        backlog = backlog.with_for_update(skip_locked=True)
+    ids = db.session.execute(
+        update(Document)
+        .where(Document.id.in_(backlog.scalar_subquery()))
+        .values(claimed_by=moderator_id, claimed_until=now + timedelta(seconds=lease))
+        .returning(Document.id)
+        .execution_options(synchronize_session=False)
+    ).scalars().all()
+    db.session.commit()
+    return ids
+
+
+def claimed(moderator_id):
+    return db.session.execute(
+        select(Document, User.email)
+        .join(User, User.id == Document.user_id)
+        .where(Document.status == "Pending", Document.claimed_by == moderator_id,
+               Document.claimed_until >= datetime.utcnow())
+        .order_by(Document.created_at)
+    ).all()
+
+
+def release(moderator_id, ids):
+    result = db.session.execute(
+        update(Document)
+        .where(Document.id.in_(ids), Document.status == "Pending", Document.claimed_by == moderator_id)
+        .values(claimed_by=None, claimed_until=None)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return result.rowcount
+
+
+def review(moderator_id, ids, outcome, chunk_size=500):
+    """Approve or reject documents, and with them their owners' ``student_id_status``.
+
+    Only pending documents this moderator holds, or that nobody holds, are
+    touched, so a document is never decided twice. A user's status follows
+    their student ID documents only, once none of those is still pending.
+    Returns the count.
+    """
+    if outcome not in OUTCOMES:
+        raise ValueError(outcome)
+    reviewed = 0
+    users = set()
+    for chunk in chunked(ids, chunk_size):
+        now = datetime.utcnow()
+        rows = db.session.execute(
+            update(Document)
+            .where(Document.id.in_(chunk), Document.status == "Pending",
+                   or_(Document.claimed_by == moderator_id, lease_open(now)))
+            .values(status=outcome, reviewed_by=moderator_id, reviewed_at=now, claimed_by=None, claimed_until=None)
+            .returning(Document.user_id, Document.type)
+            .execution_options(synchronize_session=False)
+        ).all()
+        owners = {user_id for user_id, kind in rows if kind == "student_id"}
+        if owners:
+            owners -= set(db.session.execute(
+                select(Document.user_id).distinct()
+                .where(Document.user_id.in_(owners), Document.type == "student_id", Document.status == "Pending")
+            ).scalars())
+        if owners:
+            db.session.execute(
+                update(User).where(User.id.in_(owners)).values(student_id_status=outcome)
+                .execution_options(synchronize_session=False)
+            )
+        db.session.commit()
+        reviewed += len(rows)
+        users.update(owners)
+    for user_id in users:
+        principal.invalidate(user_id)
+    if reviewed:
+        get_throughput().observe(outcome, reviewed)
+    return reviewed
+
+
+def queue_stats():
+    now = datetime.utcnow()
+    pending = db.session.execute(
+        select(func.count(), func.min(Document.created_at)).where(Document.status == "Pending")
+    ).one()
+    claimed_count = db.session.execute(
+        select(func.count()).where(Document.status == "Pending", Document.claimed_until >= now)
+    ).scalar()
+    last_hour = db.session.execute(
+        select(func.count()).where(Document.reviewed_at >= now - timedelta(hours=1))
+    ).scalar()
+    return {
+        "backlog": pending[0],
+        "claimed": claimed_count,
+        "oldest_age_seconds": (now - pending[1]).total_seconds() if pending[1] else 0.0,
+        "reviewed_last_hour": last_hour,
+    }
+
+
+def collect_metrics():
+    stats = queue_stats()
+    lines = []
+    for name, help_text, value in (
+        ("backlog", "Pending documents awaiting review.", stats["backlog"]),
+        ("claimed", "Pending documents leased to a moderator.", stats["claimed"]),
+        ("oldest_age_seconds", "Age of the oldest pending document.", f"{stats['oldest_age_seconds']:.0f}"),
+        ("reviewed_last_hour", "Documents reviewed in the past hour, all workers.", stats["reviewed_last_hour"]),
+    ):
+        lines += [f"# HELP modswap_review_{name} {help_text}", f"# TYPE modswap_review_{name} gauge",
+                  f"modswap_review_{name} {value}"]
+    lines += ["# HELP modswap_review_decisions_total Documents reviewed by this process.",
+              "# TYPE modswap_review_decisions_total counter"]
+    for outcome, total in get_throughput().totals.items():
+        lines.append(f'modswap_review_decisions_total{{outcome="{outcome.lower()}"}} {total}')
+    return lines
+
+
+def init_app(app):
+    if app.config["METRICS_ENABLED"]:
+        with app.app_context():
+            instrumentation.add_collector(collect_metrics)
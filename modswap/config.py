@@ -1,5 +1,11 @@
 import os
 
+
+def _default_auto_migrate():
+    url = os.environ.get("DATABASE_URL") or "sqlite://"
+    return "true" if url.startswith("sqlite") else "false"
+
+
 class Config:
     SECRET_KEY = os.environ.get("SECRET_KEY", "dev-secret")
     SQLALCHEMY_DATABASE_URI = os.environ.get("DATABASE_URL") or (
@@ -11,5 +17,55 @@ class Config:
     MAIL_USE_TLS = os.environ.get("MAIL_USE_TLS", "false").lower() == "true"
     MAIL_USERNAME = os.environ.get("MAIL_USERNAME")
     MAIL_PASSWORD = os.environ.get("MAIL_PASSWORD")
+    MAIL_DEFAULT_SENDER = os.environ.get("MAIL_DEFAULT_SENDER", "ModSwap <noreply@modswap.app>")
     RESEND_API_KEY = os.environ.get("RESEND_API_KEY")
+    MAIL_TRANSPORT = os.environ.get("MAIL_TRANSPORT") or ("resend" if os.environ.get("RESEND_API_KEY") else "smtp")
+    MAIL_DIGEST_DELAY = int(os.environ.get("MAIL_DIGEST_DELAY", "60"))
+    MAIL_DIGEST_MAX = int(os.environ.get("MAIL_DIGEST_MAX", "50"))
+    MAIL_MAX_ATTEMPTS = int(os.environ.get("MAIL_MAX_ATTEMPTS", "5"))
+    MAIL_RETRY_BASE = int(os.environ.get("MAIL_RETRY_BASE", "30"))
+    DISPATCH_WORKERS = int(os.environ.get("DISPATCH_WORKERS", "4"))
+    DISPATCH_LEASE = int(os.environ.get("DISPATCH_LEASE", "300"))
+    DISPATCH_IN_PROCESS = os.environ.get("DISPATCH_IN_PROCESS", "false").lower() == "true"
     REDIS_URL = os.environ.get("REDIS_URL")
+    USER_CACHE_TTL = int(os.environ.get("USER_CACHE_TTL", "60"))
+    SWAP_INDEX_TTL = int(os.environ.get("SWAP_INDEX_TTL", "300"))
+    SUGGEST_LIMIT = int(os.environ.get("SUGGEST_LIMIT", "20"))
+    MATCH_ALERT_LIMIT = int(os.environ.get("MATCH_ALERT_LIMIT", "50"))
+    # One-sided overlaps alert only from this many shared modules up.
+    MATCH_ALERT_MIN_SCORE = int(os.environ.get("MATCH_ALERT_MIN_SCORE", "4"))
+    CHAIN_MAX_LEN = int(os.environ.get("CHAIN_MAX_LEN", "4"))
+    CHAIN_REFRESH_INTERVAL = int(os.environ.get("CHAIN_REFRESH_INTERVAL", "30"))
+    ADMIN_PAGE_SIZE = int(os.environ.get("ADMIN_PAGE_SIZE", "50"))
+    # Seconds a filtered admin view reuses its per-module give/want counts.
+    ADMIN_COUNTS_TTL = int(os.environ.get("ADMIN_COUNTS_TTL", "30"))
+    PROFILE_PAGE_SIZE = int(os.environ.get("PROFILE_PAGE_SIZE", "20"))
+    UNREAD_COUNT_TTL = int(os.environ.get("UNREAD_COUNT_TTL", "3600"))
+    UNREAD_COUNT_LOCAL_TTL = int(os.environ.get("UNREAD_COUNT_LOCAL_TTL", "5"))
+    NOTIFICATION_PUSH = os.environ.get("NOTIFICATION_PUSH", "true").lower() == "true"
+    EXPIRY_SWEEP_INTERVAL = int(os.environ.get("EXPIRY_SWEEP_INTERVAL", "300"))
+    EXPIRY_BATCH_SIZE = int(os.environ.get("EXPIRY_BATCH_SIZE", "500"))
+    ADMIN_BULK_CHUNK = int(os.environ.get("ADMIN_BULK_CHUNK", "500"))
+    METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "true").lower() == "true"
+    METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+    QUERY_BUDGET_STRICT = os.environ.get("QUERY_BUDGET_STRICT", "false").lower() == "true"
+    CATALOGUE_CACHE_SIZE = int(os.environ.get("CATALOGUE_CACHE_SIZE", "32"))
+    CATALOGUE_TTL = int(os.environ.get("CATALOGUE_TTL", "300"))
+    SEARCH_VOCAB_TTL = int(os.environ.get("SEARCH_VOCAB_TTL", "600"))
+    CHAT_BATCH_SIZE = int(os.environ.get("CHAT_BATCH_SIZE", "100"))
+    CHAT_FLUSH_INTERVAL = float(os.environ.get("CHAT_FLUSH_INTERVAL", "0.5"))
+    CHAT_MAX_LENGTH = int(os.environ.get("CHAT_MAX_LENGTH", "2000"))
+    EXPORT_BATCH_SIZE = int(os.environ.get("EXPORT_BATCH_SIZE", "1000"))
+    STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "local")
+    MEDIA_ROOT = os.environ.get("MEDIA_ROOT")
+    MEDIA_MAX_AGE = int(os.environ.get("MEDIA_MAX_AGE", str(365 * 24 * 3600)))
+    AVATAR_MAX_BYTES = int(os.environ.get("AVATAR_MAX_BYTES", str(2 * 1024 * 1024)))
+    DOCUMENT_MAX_BYTES = int(os.environ.get("DOCUMENT_MAX_BYTES", str(10 * 1024 * 1024)))
+    MEDIA_DELETE_GRACE = int(os.environ.get("MEDIA_DELETE_GRACE", "60"))
+    # Werkzeug refuses larger bodies with 413, chunked ones included; views
+    # marked no_body_limit are exempt.
+    MAX_CONTENT_LENGTH = int(os.environ.get("MAX_CONTENT_LENGTH", str(12 * 1024 * 1024)))
+    REVIEW_CLAIM_BATCH = int(os.environ.get("REVIEW_CLAIM_BATCH", "25"))
+    REVIEW_LEASE = int(os.environ.get("REVIEW_LEASE", "900"))
+    AUTO_MIGRATE = os.environ.get("AUTO_MIGRATE", _default_auto_migrate()).lower() == "true"
+    SEED_ON_MIGRATE = os.environ.get("SEED_ON_MIGRATE", "true").lower() == "true"
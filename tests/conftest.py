@@ -0,0 +1,76 @@
+import pytest
+from modswap.config import Config
+from modswap.app import create_app
+from modswap.app.extensions import db
+from modswap.app.models import Document, Module, Notification, SwapRequest, User, module_signature
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    for key, value in {
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'modswap.db'}",
+        "TESTING": True,
+        "AUTO_MIGRATE": True,
+        "SEED_ON_MIGRATE": False,
+        "EXPIRY_SWEEP_INTERVAL": 0,
+        "MAIL_TRANSPORT": "memory",
+        "MEDIA_ROOT": str(tmp_path / "media"),
+        "REDIS_URL": None,
+    }.items():
+        monkeypatch.setattr(Config, key, value, raising=False)
+    # No app context is held here: each test-client request gets a fresh one,
+    # so the per-request query counter starts from zero.
+    return create_app()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def login(client):
+    def login(user_id, role="student"):
+        with client.session_transaction() as sess:
+            sess["_user_id"] = str(user_id)
+            sess["_fresh"] = True
+            sess["role"] = role
+    return login
+
+
+def make_swap(user_id, give_ids, want_ids, **fields):
+    swap = SwapRequest(user_id=user_id, module_signature=module_signature(give_ids, want_ids), **fields)
+    swap.giving = [db.session.get(Module, mid) for mid in give_ids]
+    swap.wanting = [db.session.get(Module, mid) for mid in want_ids]
+    db.session.add(swap)
+    return swap
+
+
+@pytest.fixture
+def data(app):
+    """Two students with a page of swaps each, a teacher, notifications and documents."""
+    with app.app_context():
+        teacher = User(email="teacher@uni.ac.uk", role="teacher")
+        students = [User(email=f"student{i}@uni.ac.uk", role="student") for i in range(2)]
+        modules = [Module(code=f"MOD-{i:03}", name=f"Module {i}", department="Computing", university="uni", year=1 + i % 3)
+                   for i in range(12)]
+        db.session.add_all([teacher, *students, *modules])
+        db.session.flush()
+        ids = [m.id for m in modules]
+        swaps = []
+        for n, student in enumerate(students):
+            # Student 1's swaps mirror student 0's, so each pair is a mutual match.
+            for i in range(10):
+                give = [ids[(i + 6 * n) % 12], ids[(i + 6 * n + 1) % 12]]
+                want = [ids[(i + 6 * n + 6) % 12], ids[(i + 6 * n + 7) % 12]]
+                swaps.append(make_swap(student.id, give, want, notes=f"swap {n}-{i}"))
+            for i in range(5):
+                db.session.add(Notification(user_id=student.id, type="match", payload='{"message": "New match"}'))
+            db.session.add(Document(user_id=student.id, type="student_id", path=f"docs/ab/{n:064}.pdf"))
+        db.session.commit()
+        return {
+            "teacher": teacher.id,
+            "students": [s.id for s in students],
+            "modules": ids,
+            "swaps": [s.id for s in swaps],
+        }
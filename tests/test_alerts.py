@@ -0,0 +1,50 @@
+import json
+from modswap.app import moderation
+from modswap.app.extensions import db
+from modswap.app.matching import SwapIndex, get_swap_index
+from modswap.app.models import Notification
+
+
+def match_alerts(app, user_id):
+    with app.app_context():
+        return [json.loads(n.payload) for n in db.session.execute(
+            db.select(Notification).filter_by(user_id=user_id, type="match")
+        ).scalars() if "matched_swap_id" in (n.payload or "")]
+
+
+def test_only_mutual_matches_alert(app, client, login, data):
+    owner, creator = data["students"]
+    modules = data["modules"]
+    login(creator)
+    # Module 5 is given by swaps 4 and 5, neither of which wants module 6:
+    # a one-sided overlap.
+    client.post("/swaps/create", data={"give": [modules[6]], "want": [modules[5]]})
+    assert match_alerts(app, owner) == []
+    # Swap 0 gives module 0 and wants module 6: a match both ways.
+    client.post("/swaps/create", data={"give": [modules[6]], "want": [modules[0]]})
+    alerts = match_alerts(app, owner)
+    assert [a["matched_swap_id"] for a in alerts] == [data["swaps"][0]]
+
+
+def test_swaps_closed_by_another_process_leave_the_index(app, data):
+    closed = data["swaps"][0]
+    with app.app_context():
+        assert closed in get_swap_index().entries
+        # archive_swaps leaves this process's index alone, as another worker's would.
+        moderation.archive_swaps([closed], "Approved")
+        assert closed not in get_swap_index().entries
+
+
+def test_no_alert_for_a_match_closed_since_the_last_catch_up(app, client, login, data, monkeypatch):
+    owner, creator = data["students"]
+    modules = data["modules"]
+    closed = data["swaps"][0]
+    with app.app_context():
+        get_swap_index()
+        moderation.archive_swaps([closed], "Approved")
+    monkeypatch.setattr(SwapIndex, "_drop_resolved", lambda self: 0)
+    login(creator)
+    client.post("/swaps/create", data={"give": [modules[6]], "want": [modules[0]]})
+    assert match_alerts(app, owner) == []
+    with app.app_context():
+        assert closed not in get_swap_index().entries
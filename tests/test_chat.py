@@ -0,0 +1,59 @@
+import pytest
+from modswap.app import moderation
+from modswap.app.extensions import db, socketio
+from modswap.app.models import Message
+
+
+@pytest.fixture
+def socket(app, client, login, data):
+    login(data["students"][1])
+    return socketio.test_client(app, flask_test_client=client)
+
+
+@pytest.mark.parametrize("payload", [
+    {"swap_id": "abc"},
+    {"swap_id": None},
+    {"swap_id": [1]},
+    {},
+    {"swap_id": 1, "with": "abc"},
+    "not a dict",
+])
+def test_malformed_ids_are_refused(socket, payload):
+    assert socket.emit("join", payload, callback=True) == {"ok": False}
+    if isinstance(payload, dict):
+        payload = {**payload, "content": "hi"}
+    assert socket.emit("message", payload, callback=True) == {"ok": False}
+
+
+def test_join_and_message_with_string_ids(socket, data):
+    swap_id = data["swaps"][0]
+    assert socket.emit("join", {"swap_id": str(swap_id)}, callback=True) == {"ok": True}
+    assert socket.emit("message", {"swap_id": str(swap_id), "content": "hello"}, callback=True) == {"ok": True}
+    assert socket.emit("message", {"swap_id": swap_id, "content": 5}, callback=True) == {"ok": False}
+
+
+def test_archived_swap_history_is_read_only(app, client, socket, data):
+    swap_id, owner, me = data["swaps"][0], *data["students"]
+    with app.app_context():
+        db.session.add(Message(swap_id=swap_id, sender_id=me, receiver_id=owner, content="still keen?"))
+        db.session.commit()
+        moderation.archive_swaps([swap_id], "Approved")
+
+    response = client.get(f"/chat/{swap_id}")
+    assert response.status_code == 200
+    assert b"read-only" in response.data
+    history = client.get(f"/chat/{swap_id}/messages").get_json()
+    assert [m["content"] for m in history["messages"]] == ["still keen?"]
+    assert socket.emit("join", {"swap_id": swap_id}, callback=True) == {"ok": False}
+    assert socket.emit("message", {"swap_id": swap_id, "content": "hi"}, callback=True) == {"ok": False}
+    assert client.get(f"/chat/{max(data['swaps']) + 100}").status_code == 404
+
+
+@pytest.mark.parametrize("limit", [0, -5])
+def test_history_limit_is_clamped(app, client, socket, data, limit):
+    swap_id, owner, me = data["swaps"][0], *data["students"]
+    with app.app_context():
+        db.session.add_all([Message(swap_id=swap_id, sender_id=me, receiver_id=owner, content=f"m{i}") for i in range(2)])
+        db.session.commit()
+    page = client.get(f"/chat/{swap_id}/messages", query_string={"limit": limit}).get_json()
+    assert len(page["messages"]) == 1 and page["next"] is not None
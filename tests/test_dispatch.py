@@ -0,0 +1,23 @@
+from datetime import datetime
+from modswap.app import dispatch
+from modswap.app.extensions import db
+from modswap.app.models import DispatchJob
+
+
+def jobs(user_id):
+    return db.session.execute(db.select(DispatchJob).filter_by(user_id=user_id)).scalars().all()
+
+
+def test_one_waiting_job_per_user_even_after_a_retry(app, data):
+    user, other = data["students"]
+    with app.app_context():
+        queue = dispatch.TableQueue()
+        assert queue.push([user, other], datetime.utcnow()) == 2
+        # A second push for the same users, e.g. from another worker, adds nothing.
+        assert queue.push([user, other], datetime.utcnow()) == 0
+        claimed = [job for job in queue.claim(10, lease=600) if job.user_id == user]
+        assert queue.push([user], datetime.utcnow()) == 1
+        # The retried job would make a second waiting one; the pushed job covers it.
+        queue.retry(claimed[0], datetime.utcnow(), "timeout")
+        waiting = jobs(user)
+        assert len(waiting) == 1 and waiting[0].locked_until is None
@@ -0,0 +1,35 @@
+import io
+import pytest
+from modswap.app import importer
+from modswap.app.extensions import db
+from modswap.app.models import Module
+
+
+def test_jsonl_non_object_rows_are_skipped(app):
+    lines = '{"code": "A1", "name": "Alpha", "university": "uni"}\n[1, 2]\n"text"\n42\n'
+    with app.app_context():
+        result = importer.import_modules(io.StringIO(lines), "jsonl")
+        assert (result["imported"], result["skipped"]) == (1, 3)
+        assert db.session.execute(db.select(Module.code)).scalars().all() == ["A1"]
+
+
+def test_jsonl_non_string_fields_are_coerced_or_skipped(app):
+    lines = ('{"code": 101, "name": "Numbers", "university": "uni", "department": 7}\n'
+             '{"code": {"x": 1}, "name": "Nested", "university": "uni"}\n'
+             '{"code": "B2", "name": ["list"], "university": "uni"}\n')
+    with app.app_context():
+        result = importer.import_modules(io.StringIO(lines), "jsonl")
+        assert (result["imported"], result["skipped"]) == (1, 2)
+        module = db.session.execute(db.select(Module)).scalar_one()
+        assert (module.code, module.department) == ("101", "7")
+
+
+def test_malformed_csv_raises_value_error_and_keeps_committed_batches(app):
+    # A field over csv.field_size_limit() makes the reader raise csv.Error.
+    body = "code,name,university\nA1,Alpha,uni\nA2,Beta,uni\nA3," + "x" * 200_000 + ",uni\n"
+    with app.app_context():
+        app.extensions["search_vocab"] = object()
+        with pytest.raises(ValueError):
+            importer.import_modules(io.StringIO(body), "csv", batch_size=1)
+        assert "search_vocab" not in app.extensions
+        assert db.session.execute(db.select(Module.code).order_by(Module.code)).scalars().all() == ["A1", "A2"]
@@ -0,0 +1,62 @@
+from modswap.app import catalogue, dispatch, inbox, principal
+from modswap.app.extensions import get_redis
+
+
+def test_local_counts_expire_quickly(app):
+    with app.app_context():
+        counts = inbox.get_counts()
+        assert counts.redis is None
+        assert counts.ttl == app.config["UNREAD_COUNT_LOCAL_TTL"]
+
+
+def test_fill_after_miss_keeps_newer_entry(app):
+    counts = inbox.UnreadCounts(ttl=60)
+    counts.set(1, 4)
+    assert counts.add(1, 1) == 5
+    # A count read before that notification committed must not replace it.
+    counts.fill(1, 4)
+    assert counts.get(1) == 5
+    counts.fill(2, 3)
+    assert counts.get(2) == 3
+
+
+def test_unread_count_follows_notify_and_read(app, client, login, data):
+    user = data["students"][0]
+    login(user)
+    assert client.get("/notifications/unread").get_json() == {"unread": 5}
+    with app.app_context():
+        inbox.notify([{"user_id": user, "type": "reminder", "payload": '{"message": "hi"}'}])
+    assert client.get("/notifications/unread").get_json() == {"unread": 6}
+    assert client.post("/notifications/read", json={"all": True}).get_json() == {"updated": 6, "unread": 0}
+
+
+def test_notifications_page_by_cursor(client, login, data):
+    login(data["students"][0])
+    seen, before = [], None
+    while True:
+        page = client.get("/notifications/", query_string={"limit": 2, "before": before} if before else {"limit": 2})
+        body = page.get_json()
+        seen += [n["id"] for n in body["notifications"]]
+        before = body["next"]
+        if before is None:
+            break
+    assert sorted(seen, reverse=True) == seen and len(set(seen)) == 5
+    assert client.get("/notifications/", query_string={"before": "garbage"}).status_code == 200
+
+
+def test_redis_client_is_shared(app):
+    app.config["REDIS_URL"] = "redis://localhost:6379/15"
+    with app.app_context():
+        client = get_redis()
+        assert client is get_redis()
+        assert principal.get_cache().redis is client
+        assert inbox.get_counts().redis is client
+        assert catalogue.get_catalogue().redis is client
+        assert dispatch.get_queue().client is client
+
+
+def test_notifications_limit_is_clamped(client, login, data):
+    login(data["students"][0])
+    for limit in (0, -5):
+        body = client.get("/notifications/", query_string={"limit": limit}).get_json()
+        assert len(body["notifications"]) == 1 and body["next"] is not None
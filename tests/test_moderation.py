@@ -0,0 +1,65 @@
+from modswap.app import matching, moderation, stats
+from modswap.app.matching import get_swap_index
+from modswap.app.extensions import db
+from modswap.app.models import SwapArchive, SwapRequest, swap_give_modules, swap_want_modules
+
+
+def count(table, *where):
+    return db.session.execute(db.select(db.func.count()).select_from(table).where(*where)).scalar()
+
+
+def test_bulk_actions_report_affected_counts_across_chunks(app, client, login, data):
+    app.config["ADMIN_BULK_CHUNK"] = 3
+    login(data["teacher"], "teacher")
+    approve, needs_info = data["swaps"][:7], data["swaps"][7:12]
+    missing = max(data["swaps"]) + 100
+
+    response = client.post("/admin/swaps/bulk", data={"action": "approve", "ids": approve + [missing]},
+                           follow_redirects=True)
+    assert b"Updated 7 request(s)" in response.data
+    response = client.post("/admin/swaps/bulk", data={"action": "needs_info", "ids": needs_info + [missing]},
+                           follow_redirects=True)
+    assert b"Updated 5 request(s)" in response.data
+
+    with app.app_context():
+        assert count(SwapRequest.__table__, SwapRequest.id.in_(approve)) == 0
+        assert count(SwapArchive.__table__, SwapArchive.status == "Approved") == 7
+        for table in (swap_give_modules, swap_want_modules):
+            assert count(table, table.c.swap_id.in_(approve)) == 0
+        assert count(SwapRequest.__table__, SwapRequest.status == "Needs Info") == 5
+
+
+def test_resolved_swap_is_archived_once(app, client, login, data):
+    swap_id, owner = data["swaps"][0], data["students"][0]
+    login(data["teacher"], "teacher")
+    client.post(f"/admin/swaps/{swap_id}/status", data={"status": "Approved"})
+    client.post(f"/admin/swaps/{swap_id}/status", data={"status": "Rejected"})
+    with app.app_context():
+        assert moderation.archive_swaps([swap_id], "Approved") == 0
+        statuses = db.session.execute(db.select(SwapArchive.status).where(SwapArchive.id == swap_id)).scalars()
+        assert statuses.all() == ["Approved"]
+        counts = stats.for_user(owner)
+        assert (counts["approved"], counts["rejected"], counts["requests"]) == (1, 0, 10)
+
+
+def test_archived_swap_ids_are_never_reused(app, client, login, data):
+    user, modules = data["students"][1], data["modules"]
+    last = max(data["swaps"])
+    with app.app_context():
+        assert moderation.archive_swaps([last], "Approved") == 1
+    login(user)
+    client.post("/swaps/create", data={"give": [modules[0]], "want": [modules[5]]})
+    with app.app_context():
+        fresh = db.session.execute(db.select(db.func.max(SwapRequest.id))).scalar()
+        assert fresh > last
+        assert moderation.archive_swaps([fresh], "Rejected") == 1
+
+
+def test_admin_scores_come_from_the_index_or_a_cached_count(app, data):
+    with app.app_context():
+        every_swap = db.select(SwapRequest.id)
+        indexed = get_swap_index().module_counts(data["modules"])
+        assert indexed == matching.module_counts_within(every_swap)
+        first = matching.cached_module_counts(("status", "Open"), every_swap, ttl=60)
+        assert matching.cached_module_counts(("status", "Open"), every_swap, ttl=60) is first
+        assert first == indexed
@@ -0,0 +1,48 @@
+import pytest
+
+
+# Each view is wrapped in query_budget(); in testing mode going over it raises
+# QueryBudgetExceeded, so an N+1 regression fails here rather than in prod.
+
+@pytest.mark.parametrize("method, path", [
+    ("get", "/swaps/"),
+    ("get", "/profile/"),
+    ("get", "/swaps/create"),
+    ("get", "/swaps/chains"),
+    ("get", "/notifications/"),
+    ("get", "/notifications/unread"),
+])
+def test_student_views_stay_within_budget(client, login, data, method, path):
+    login(data["students"][0])
+    response = getattr(client, method)(path)
+    assert response.status_code == 200
+
+
+def test_suggest_stays_within_budget(client, login, data):
+    login(data["students"][1])
+    modules = data["modules"]
+    response = client.post("/swaps/suggest", data={"give": modules[6:8], "want": modules[0:2]})
+    assert response.status_code == 200
+    assert f'href="/chat/{data["swaps"][0]}"'.encode() in response.data
+
+
+@pytest.mark.parametrize("path", ["/admin/swaps", "/admin/chains", "/admin/documents"])
+def test_admin_views_stay_within_budget(client, login, data, path):
+    login(data["teacher"], "teacher")
+    response = client.get(path)
+    assert response.status_code == 200
+
+
+def test_budget_overrun_raises(app, client, login, data):
+    from modswap.app.instrumentation import QueryBudgetExceeded, query_budget
+    from modswap.app.extensions import db
+    from modswap.app.models import SwapRequest
+
+    @app.get("/_n_plus_one")
+    @query_budget(3)
+    def n_plus_one():
+        swaps = db.session.execute(db.select(SwapRequest)).scalars().all()
+        return str(sum(len(s.giving) for s in swaps))
+
+    with pytest.raises(QueryBudgetExceeded):
+        client.get("/_n_plus_one")
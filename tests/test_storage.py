@@ -0,0 +1,63 @@
+import io
+from modswap.app import storage
+from modswap.app.extensions import db
+from modswap.app.models import Module, User
+
+
+def test_reused_file_survives_delete_until_grace_passes(app):
+    with app.app_context():
+        files = storage.get_storage()
+        key = files.save(io.BytesIO(b"same bytes"), "avatars", "png", 1024)
+        # A second upload of the same bytes lands on the same key before its
+        # reference is committed; the first owner's delete must not take it.
+        assert files.save(io.BytesIO(b"same bytes"), "avatars", "png", 1024) == key
+        assert not files.delete_unused(key, lambda k: False, grace=60)
+        assert files.exists(key)
+        assert not files.delete_unused(key, lambda k: True, grace=0)
+        assert files.delete_unused(key, lambda k: False, grace=0)
+        assert not files.exists(key)
+
+
+def test_delete_if_unreferenced_keeps_shared_file(app):
+    app.config["MEDIA_DELETE_GRACE"] = 0
+    with app.app_context():
+        key = storage.get_storage().save(io.BytesIO(b"avatar"), "avatars", "png", 1024)
+        db.session.add(User(email="other@uni.ac.uk", profile_image=key))
+        db.session.commit()
+        storage.delete_if_unreferenced(key)
+        assert storage.get_storage().exists(key)
+        db.session.execute(db.update(User).values(profile_image=None))
+        db.session.commit()
+        storage.delete_if_unreferenced(key)
+        assert not storage.get_storage().exists(key)
+
+
+def test_upload_limits_are_per_route(app, client, login, data):
+    app.config["AVATAR_MAX_BYTES"] = 1024
+    login(data["students"][0])
+    big = io.BytesIO(b"x" * 200 * 1024)
+    response = client.post("/profile/", data={"avatar": (big, "me.png")}, follow_redirects=True)
+    assert b"Image is too large" in response.data
+
+    # The module catalogue import is not capped by the upload limits.
+    rows = "".join(f"BIG-{i},{'n' * 64 * 1024},uni\n" for i in range(200))
+    login(data["teacher"], "teacher")
+    response = client.post("/admin/modules/import", data={
+        "catalogue": (io.BytesIO(("code,name,university\n" + rows).encode()), "modules.csv"),
+    })
+    assert response.status_code == 302
+    with app.app_context():
+        count = db.session.execute(db.select(db.func.count()).where(Module.code.like("BIG-%"))).scalar()
+        assert count == 200
+
+
+def test_chunked_uploads_are_refused(app, client, login, data):
+    app.config["MAX_CONTENT_LENGTH"] = 1024
+    login(data["students"][0])
+    chunked = {"content_type": "multipart/form-data; boundary=x", "headers": {"Transfer-Encoding": "chunked"},
+               "environ_overrides": {"wsgi.input_terminated": True}}
+    response = client.post("/profile/documents/upload", input_stream=io.BytesIO(b"x" * 4096), **chunked)
+    assert response.status_code == 411
+    # Without a length up front the global cap still stops the stream.
+    response = client.post("/swaps/create", input_stream=io.BytesIO(b"x" * 4096), **chunked)
+    assert response.status_code == 413
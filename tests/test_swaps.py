@@ -0,0 +1,38 @@
+import pytest
+from sqlalchemy import event, insert
+from sqlalchemy.exc import IntegrityError
+from modswap.app.extensions import db
+from modswap.app.models import SwapRequest, module_signature
+
+
+def test_duplicate_lost_race_is_reported_not_raised(app, client, login, data):
+    user, modules = data["students"][1], data["modules"]
+    signature = module_signature([modules[0]], [modules[3]])
+
+    def concurrent_submit(session, flush_context, instances):
+        # The identical request commits after create_post's duplicate check
+        # but before its own insert: only the unique index can catch it.
+        with db.engine.begin() as conn:
+            conn.execute(insert(SwapRequest.__table__).values(user_id=user, status="Open", module_signature=signature))
+
+    login(user)
+    with app.app_context():
+        event.listen(db.session, "before_flush", concurrent_submit, once=True)
+    response = client.post("/swaps/create", data={"give": [modules[0]], "want": [modules[3]]},
+                           follow_redirects=True)
+    assert b"Duplicate request already exists" in response.data
+    with app.app_context():
+        rows = db.session.execute(db.select(SwapRequest.id).filter_by(user_id=user, module_signature=signature))
+        assert len(rows.all()) == 1
+
+
+def test_other_integrity_errors_are_not_reported_as_duplicates(app, client, login, data, monkeypatch):
+    user, modules = data["students"][1], data["modules"]
+
+    def broken_commit():
+        raise IntegrityError("INSERT INTO swap_requests", {}, Exception("NOT NULL constraint failed"))
+
+    login(user)
+    monkeypatch.setattr(db.session, "commit", broken_commit)
+    with pytest.raises(IntegrityError):
+        client.post("/swaps/create", data={"give": [modules[0]], "want": [modules[3]]})
@@ -0,0 +1,55 @@
+from datetime import datetime, timedelta
+from modswap.app import verification
+from modswap.app.extensions import db
+from modswap.app.models import Document, User
+
+
+def add_documents(user_id, count, kind="student_id"):
+    docs = [Document(user_id=user_id, type=kind, path=f"docs/cd/{kind}-{user_id}-{i}.pdf") for i in range(count)]
+    db.session.add_all(docs)
+    db.session.commit()
+    return [d.id for d in docs]
+
+
+def test_claims_never_overlap_until_the_lease_runs_out(app, data):
+    with app.app_context():
+        add_documents(data["students"][0], 10)
+        other = User(email="teacher2@uni.ac.uk", role="teacher")
+        db.session.add(other)
+        db.session.commit()
+        first, second = data["teacher"], other.id
+
+        mine = verification.claim(first, limit=5, lease=600)
+        theirs = verification.claim(second, limit=5, lease=600)
+        assert len(mine) == len(theirs) == 5 and not set(mine) & set(theirs)
+        assert len(verification.claim(second, limit=5, lease=600)) == 2
+        assert verification.claim(first, limit=5, lease=600) == []
+        # Documents leased to someone else cannot be decided by this moderator.
+        assert verification.review(second, mine, "Approved") == 0
+
+        db.session.execute(db.update(Document).where(Document.id.in_(mine))
+                           .values(claimed_until=datetime.utcnow() - timedelta(seconds=1)))
+        db.session.commit()
+        assert sorted(verification.claim(second, limit=10, lease=600)) == sorted(mine)
+        assert verification.review(second, mine, "Approved") == 5
+
+
+def test_status_follows_pending_student_id_documents_only(app, data):
+    user = data["students"][0]
+    with app.app_context():
+        db.session.execute(db.update(Document).values(status="Approved"))
+        db.session.execute(db.update(User).where(User.id == user).values(student_id_status="Pending"))
+        db.session.commit()
+        transcript = add_documents(user, 1, "transcript")
+        first, second = add_documents(user, 2)
+
+        def status():
+            db.session.expire_all()
+            return db.session.get(User, user).student_id_status
+
+        verification.review(data["teacher"], transcript, "Rejected")
+        assert status() == "Pending"
+        verification.review(data["teacher"], [first], "Rejected")
+        assert status() == "Pending"
+        verification.review(data["teacher"], [second], "Approved")
+        assert status() == "Approved"